@@ -0,0 +1,431 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Dataset sizes benchmarked by default, as multiples of India.csv (larger ones are written by Synthetic.py)
+SCALES = [1, 10, 100, 1000]
+# Sessions each scenario is replayed in; the first is reported as the cold run
+REPEATS = 5
+# Simulated sessions of the concurrent run; 0 skips it
+SESSIONS = 4
+# A measurement regresses when it exceeds its baseline by this fraction and by the floor of its unit
+TOLERANCE = 0.2
+FLOORS = {'ms': 5.0, 'mb': 16.0, 'bytes': 1024, 'per_s': 0.5}
+DEFAULT_OUTPUT = os.path.join(BASE_DIR, '.census_cache', 'benchmark.json')
+DEFAULT_BASELINE = os.path.join(BASE_DIR, 'benchmark_baseline.json')
+
+# Widget value that clicks a button instead of setting it
+CLICK = object()
+
+
+def _last(options):
+    return options[-1]
+
+
+# Scenario -> (script, analysis type or None, steps). Each step is one measured rerun and maps
+# widget labels to the values set before it: a value, CLICK, or a function picking one of the
+# widget's options. Labels that match no widget are set as session state keys (e.g. tab keys).
+SCENARIOS = {
+    'overall': ('app.py', "Overall Data Analysis", [
+        {},
+        {"Select Primary Level": "Literate", "Select Secondary Level": "literacy_rate"},
+        {"Select State": "Uttar Pradesh"},
+    ]),
+    'districts_of_state': ('app.py', "Districts of the state", [
+        {},
+        {"Select State": "Uttar Pradesh", "Select Category": "literacy_rate"},
+        {"Select Top or Bottom District of Uttar Pradesh": "Bottom", "Number of Districts": 10},
+    ]),
+    'district_counts': ('app.py', "Number of Districts by State", [
+        {},
+        {"Select State": "Uttar Pradesh"},
+    ]),
+    'state_comparison': ('app.py', "Category-wise State Comparison", [
+        {},
+        {"Select Category": "Female Literacy Rate", "Select Top or Bottom States": "Bottom"},
+        {"Select Category": "Population", "Number of States": 10},
+    ]),
+    'district_level': ('app.py', "District-Level Analysis", [
+        {},
+        {"Select State": "Kerala"},
+        {"Select District": _last, "Select Category": "literacy_rate"},
+        {"Number of Similar Districts": 20},
+    ]),
+    'nearby_districts': ('app.py', "Nearby Districts", [
+        {},
+        {"Number of Districts": 20},
+        {"Neighbours": "Within a distance"},
+        {"Distance (km)": 300},
+    ]),
+    'list_information': ('app.py', "List Information", [
+        {},
+        {"list_information_tab": "👫 Gender and Literacy"},
+        {"list_information_tab": "🏠 Households"},
+        {"list_information_tab": "📍 Districts"},
+        {"list_information_tab": "📥 Download"},
+    ]),
+    'app2_map': ('app2.py', None, [
+        {"Select Primary Parameter": "Population", "Select Secondary Parameter": "literacy_rate",
+         "Plot Graph": CLICK},
+        {"Select a State": "Kerala", "Plot Graph": CLICK},
+    ]),
+}
+
+_WIDGETS = ['selectbox', 'slider', 'radio', 'multiselect', 'toggle', 'button']
+
+
+def _memory_mb(field):
+    # A memory figure of this process from /proc (VmRSS: resident, VmHWM: peak resident);
+    # None where /proc is not available
+    try:
+        with open('/proc/self/status') as handle:
+            for line in handle:
+                if line.startswith(field + ':'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _reset_peak():
+    # Lowers VmHWM to the current resident size (Linux 4.0+), so it measures what runs next;
+    # False where that is not possible
+    try:
+        with open('/proc/self/clear_refs', 'w') as handle:
+            handle.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _peak_growth_mb(before):
+    # How far the peak resident size rose above `before` since _reset_peak(); None when unknown
+    peak = _memory_mb('VmHWM')
+    return None if before is None or peak is None else round(peak - before, 1)
+
+
+def _percentiles(latencies):
+    values = np.asarray(latencies, dtype='float64')
+    if not len(values):
+        return {}
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {'p50_ms': round(p50, 2), 'p90_ms': round(p90, 2), 'p99_ms': round(p99, 2),
+            'max_ms': round(values.max(), 2)}
+
+
+def _set(app, label, value):
+    for kind in _WIDGETS:
+        for widget in app.get(kind):
+            if getattr(widget, 'label', None) == label:
+                if value is CLICK:
+                    widget.click()
+                else:
+                    widget.set_value(value(widget.options) if callable(value) else value)
+                return
+    app.session_state[label] = value
+
+
+class _Session:
+    """
+    One simulated browser session of a scenario's script, driven by Streamlit's AppTest.
+    """
+
+    def __init__(self, script):
+        from streamlit.testing.v1 import AppTest
+
+        self.app = AppTest.from_file(os.path.join(BASE_DIR, script), default_timeout=600)
+        self.app.run()
+
+    def rerun(self, step):
+        """
+        Applies a step's widget values and reruns the script.
+
+        Returns:
+        - tuple: (latency in ms, figure payload bytes, exception messages).
+        """
+        for label, value in step.items():
+            _set(self.app, label, value)
+        start = time.perf_counter()
+        self.app.run()
+        elapsed = (time.perf_counter() - start) * 1000
+        payload = sum(len(chart.proto.spec.encode()) for chart in self.app.get('plotly_chart'))
+        return elapsed, payload, [str(error.value) for error in self.app.exception]
+
+    def replay(self, scenario):
+        """
+        Opens a scenario's page and reruns each of its steps.
+
+        Returns:
+        - list: One (latency in ms, payload bytes, exception messages) tuple per step.
+        """
+        _, option, steps = SCENARIOS[scenario]
+        if option is not None:
+            self.app.sidebar.selectbox[0].set_value(option)
+        return [self.rerun(step) for step in steps]
+
+
+def run_scenario(scenario, repeats=REPEATS):
+    """
+    Replays a scenario in `repeats` new sessions. The first session meets empty figure and
+    export caches and is reported as cold; the latency percentiles are over the others' reruns.
+    Memory is measured from the scenario's start, so earlier scenarios do not count towards it.
+
+    Returns:
+    - dict: Rerun latencies, figure payload bytes, resident memory after the scenario, how far
+      its peak rose above the memory resident at its start, and any exceptions raised.
+    """
+    script = SCENARIOS[scenario][0]
+    cold_ms, latencies, errors, payload = None, [], set(), []
+    before = _memory_mb('VmRSS') if _reset_peak() else None
+    for repeat in range(repeats):
+        results = _Session(script).replay(scenario)
+        if repeat == 0:
+            cold_ms = sum(elapsed for elapsed, _, _ in results)
+        else:
+            latencies.extend(elapsed for elapsed, _, _ in results)
+        payload = [size for _, size, _ in results]
+        errors.update(message for _, _, messages in results for message in messages)
+    return {'reruns': len(latencies), 'cold_ms': round(cold_ms, 2), **_percentiles(latencies),
+            'payload_bytes': sum(payload), 'max_payload_bytes': max(payload, default=0),
+            'rss_mb': _memory_mb('VmRSS'), 'peak_growth_mb': _peak_growth_mb(before), 'errors': sorted(errors)}
+
+
+def run_concurrent(sessions=SESSIONS, scenarios=None):
+    """
+    Runs `sessions` simulated sessions at once in this process, as a Streamlit server does. Each
+    session opens every scenario's page in turn, starting at a different one. Sessions are kept
+    open until the end, so the memory they hold is measured too.
+
+    Returns:
+    - dict: Throughput, latency percentiles under load and memory per session.
+    """
+    scenarios = list(scenarios or SCENARIOS)
+    latencies, errors, held = [], set(), []
+    lock = threading.Lock()
+
+    def session(number):
+        # One page per script, as in a browser tab of each app
+        pages = {}
+        order = scenarios[number % len(scenarios):] + scenarios[:number % len(scenarios)]
+        for scenario in order:
+            script = SCENARIOS[scenario][0]
+            if script not in pages:
+                pages[script] = _Session(script)
+            results = pages[script].replay(scenario)
+            with lock:
+                latencies.extend(elapsed for elapsed, _, _ in results)
+                errors.update(message for _, _, messages in results for message in messages)
+        with lock:
+            held.extend(pages.values())
+
+    reset = _reset_peak()
+    before = _memory_mb('VmRSS')
+    start = time.perf_counter()
+    threads = [threading.Thread(target=session, args=(number,)) for number in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    after = _memory_mb('VmRSS')
+    per_session = None if before is None or after is None else round((after - before) / sessions, 2)
+    return {'sessions': sessions, 'reruns': len(latencies), 'wall_ms': round(wall * 1000, 2),
+            'reruns_per_s': round(len(latencies) / wall, 2), **_percentiles(latencies),
+            'per_session_mb': per_session, 'peak_growth_mb': _peak_growth_mb(before if reset else None),
+            'errors': sorted(errors)}
+
+
+def _worker(repeats, sessions, scenarios):
+    # Benchmarks the census named by CENSUS_CSV in this process
+    import DataStore as ds
+
+    start = time.perf_counter()
+    rows = len(ds.census(['State']))
+    result = {'census': os.path.basename(ds.CENSUS_PATH), 'rows': rows,
+              'load_ms': round((time.perf_counter() - start) * 1000, 2), 'scenarios': {}}
+    # Every run resets the high-water mark, so the process peak is the largest one seen before each reset
+    peaks = []
+    for scenario in scenarios:
+        peaks.append(_memory_mb('VmHWM'))
+        result['scenarios'][scenario] = run_scenario(scenario, repeats)
+    if sessions:
+        peaks.append(_memory_mb('VmHWM'))
+        result['concurrent'] = run_concurrent(sessions, scenarios)
+    peaks.append(_memory_mb('VmHWM'))
+    result['peak_rss_mb'] = max((peak for peak in peaks if peak is not None), default=None)
+    return result
+
+
+def dataset(scale):
+    """
+    Returns the census CSV of a scale, writing the synthetic table with Synthetic.py if missing.
+
+    Parameters:
+    - scale (int): 1 for India.csv, otherwise the number of sub-districts per district.
+    """
+    if scale == 1:
+        return os.path.join(BASE_DIR, 'India.csv')
+    path = os.path.join(BASE_DIR, f"India_x{scale}.csv")
+    if not os.path.exists(path):
+        import Synthetic
+
+        print(f"Writing {os.path.basename(path)}", file=sys.stderr, flush=True)
+        Synthetic.write(scale, path)
+    return path
+
+
+def run(scales=None, repeats=REPEATS, sessions=SESSIONS, scenarios=None):
+    """
+    Benchmarks every scenario on each dataset scale, each in a fresh process so that
+    loading and memory are measured from scratch.
+
+    Parameters:
+    - scales (list): Dataset scales, see dataset(). SCALES when omitted.
+    - repeats (int): Sessions each scenario is replayed in.
+    - sessions (int): Simulated sessions of the concurrent run; 0 skips it.
+    - scenarios (list): Names of SCENARIOS. All when omitted.
+
+    Returns:
+    - dict: The machine-readable report, with one entry per scale under 'datasets'.
+    """
+    scenarios = list(scenarios or SCENARIOS)
+    report = {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+              'machine': platform.platform(), 'cpus': os.cpu_count(), 'repeats': repeats,
+              'datasets': {}}
+    for scale in scales or SCALES:
+        path = dataset(scale)
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'result.json')
+            command = [sys.executable, os.path.abspath(__file__), '--worker', output,
+                       '--repeats', str(repeats), '--sessions', str(sessions), '--scenarios', *scenarios]
+            print(f"Benchmarking {os.path.basename(path)}", file=sys.stderr, flush=True)
+            finished = subprocess.run(command, env={**os.environ, 'CENSUS_CSV': path}, cwd=BASE_DIR,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+            if finished.returncode:
+                raise RuntimeError(f"Benchmark of {path} failed:\n{finished.stderr[-4000:]}")
+            with open(output) as handle:
+                report['datasets'][f"x{scale}"] = json.load(handle)
+    return report
+
+
+def _flatten(entry, prefix=''):
+    # Measurements of a report keyed by path, e.g. 'x10/scenarios/overall/p90_ms'
+    values = {}
+    for name, value in entry.items():
+        if isinstance(value, dict):
+            values.update(_flatten(value, f"{prefix}{name}/"))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[prefix + name] = value
+    return values
+
+
+def _unit(name):
+    for unit in FLOORS:
+        if name.endswith('_' + unit):
+            return unit
+    return None
+
+
+def compare(report, baseline, tolerance=TOLERANCE):
+    """
+    Compares a report with a baseline report. Latencies, memory and payload sizes regress
+    when they grow, throughput when it drops, by more than `tolerance` of the baseline and
+    more than the floor of their unit in FLOORS. Measurements missing from either side are
+    skipped.
+
+    Returns:
+    - tuple: (regressions, improvements), lists of (measurement, baseline, current).
+    """
+    current = _flatten(report['datasets'])
+    previous = _flatten(baseline.get('datasets', {}))
+    regressions, improvements = [], []
+    for name in sorted(current.keys() & previous.keys()):
+        unit = _unit(name)
+        if unit is None:
+            continue
+        old, new = previous[name], current[name]
+        # Throughput is better when higher, everything else when lower
+        change = (old - new) if unit == 'per_s' else (new - old)
+        if abs(change) <= max(abs(old) * tolerance, FLOORS[unit]):
+            continue
+        (regressions if change > 0 else improvements).append((name, old, new))
+    return regressions, improvements
+
+
+def _print_report(report):
+    print(f"{'dataset':<8}{'scenario':<22}{'rows':>9}{'cold ms':>10}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}"
+          f"{'KB sent':>9}{'+peak MB':>9}")
+    for scale, entry in report['datasets'].items():
+        for scenario, result in entry['scenarios'].items():
+            print(f"{scale:<8}{scenario:<22}{entry['rows']:>9}{result['cold_ms']:>10.0f}"
+                  f"{result.get('p50_ms', 0):>9.0f}{result.get('p90_ms', 0):>9.0f}{result.get('p99_ms', 0):>9.0f}"
+                  f"{result['payload_bytes'] / 1024:>9.1f}{result['peak_growth_mb'] or 0:>9.0f}")
+            for message in result['errors']:
+                print(f"  error: {message}")
+        concurrent = entry.get('concurrent')
+        if concurrent:
+            print(f"{scale:<8}{concurrent['sessions']} sessions: {concurrent['reruns_per_s']:.1f} reruns/s, "
+                  f"p50 {concurrent.get('p50_ms', 0):.0f} ms, p99 {concurrent.get('p99_ms', 0):.0f} ms, "
+                  f"{concurrent['per_session_mb'] or 0:.1f} MB per session")
+        print(f"{scale:<8}peak RSS {entry['peak_rss_mb'] or 0:.0f} MB, loaded in {entry['load_ms']:.0f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the dashboard views headlessly and compare the results with a baseline.')
+    parser.add_argument('--scales', type=int, nargs='+', default=SCALES,
+                        help='dataset sizes as multiples of India.csv (default: 1 10 100 1000)')
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--repeats', type=int, default=REPEATS, help='sessions each scenario is replayed in')
+    parser.add_argument('--sessions', type=int, default=SESSIONS, help='concurrent sessions; 0 skips the run')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='where the JSON report is written')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='JSON report to compare with')
+    parser.add_argument('--update-baseline', action='store_true', help='store this report as the baseline')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help='allowed relative growth')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    if arguments.worker:
+        result = _worker(arguments.repeats, arguments.sessions, arguments.scenarios)
+        with open(arguments.worker, 'w') as handle:
+            json.dump(result, handle)
+        sys.exit(0)
+
+    report = run(arguments.scales, arguments.repeats, arguments.sessions, arguments.scenarios)
+    os.makedirs(os.path.dirname(os.path.abspath(arguments.output)), exist_ok=True)
+    with open(arguments.output, 'w') as handle:
+        json.dump(report, handle, indent=2)
+    _print_report(report)
+    print(f"Report written to {arguments.output}")
+
+    failed = any(result['errors'] for entry in report['datasets'].values()
+                 for result in [*entry['scenarios'].values(), entry.get('concurrent') or {'errors': []}])
+    if arguments.update_baseline:
+        with open(arguments.baseline, 'w') as handle:
+            json.dump(report, handle, indent=2)
+        print(f"Baseline written to {arguments.baseline}")
+    elif not os.path.exists(arguments.baseline):
+        print(f"No baseline at {arguments.baseline}, nothing compared; --update-baseline stores one")
+    else:
+        with open(arguments.baseline) as handle:
+            baseline = json.load(handle)
+        missing = [scale for scale in report['datasets'] if scale not in baseline.get('datasets', {})]
+        if missing:
+            print(f"Not in the baseline, not compared: {', '.join(missing)}")
+        regressions, improvements = compare(report, baseline, arguments.tolerance)
+        for label, entries in (('Regressed', regressions), ('Improved', improvements)):
+            for name, old, new in entries:
+                print(f"{label}: {name} {old:g} -> {new:g}")
+        if not regressions:
+            print(f"No regressions against {arguments.baseline}")
+        failed = failed or bool(regressions)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,978 @@
+import argparse
+import contextlib
+import functools
+import hashlib
+import glob
+import json
+import os
+import pickle
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+
+import Instrumentation as tr
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: revisions are only serialized between the threads of one process
+    fcntl = None
+
+# Shallow copies handed out by census() must never write through to the shared
+# frame; pandas 3 always behaves this way, older releases need the opt-in.
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# CENSUS_CSV points the app at another census file, e.g. one written by Synthetic.py
+CENSUS_PATH = os.environ.get('CENSUS_CSV') or os.path.join(BASE_DIR, 'India.csv')
+CENTROIDS_PATH = os.path.join(BASE_DIR, 'Latitude and Longitude State wise centroids 2020.csv')
+# Columnar snapshots of the CSV files, named after the content hash of their source
+CACHE_DIR = os.path.join(BASE_DIR, '.census_cache')
+# Bumped whenever the row layout of the snapshots changes
+SNAPSHOT_LAYOUT = 3
+# Modules defining the derived artifacts that persist_derived() pickles; the pickles are keyed on their code
+_ARTIFACT_SOURCES = ['DataStore.py', 'StateCube.py', 'Ranking.py', 'Metrics.py', 'Spatial.py', 'Similarity.py']
+# Revisions are compacted into a new snapshot once their log reaches this many bytes (or by compact())
+COMPACT_BYTES = int(os.environ.get('CENSUS_COMPACT_BYTES', str(1 << 20)))
+
+_COUNT = pa.int32()
+_RATIO = pa.float32()
+
+CENSUS_SCHEMA = pa.schema([
+    ('State', pa.dictionary(pa.int16(), pa.string())),
+    ('District', pa.dictionary(pa.int32(), pa.string())),
+    ('Latitude', pa.float32()),
+    ('Longitude', pa.float32()),
+    ('District code', pa.int32()),
+    ('Population', _COUNT),
+    ('Male', _COUNT),
+    ('Female', _COUNT),
+    ('Literate', _COUNT),
+    ('Male_Literate', _COUNT),
+    ('Female_Literate', _COUNT),
+    ('Housholds_with_Electric_Lighting', _COUNT),
+    ('Households_with_Internet', _COUNT),
+    ('Households_with_Computer', _COUNT),
+    ('sex_ratio', _RATIO),
+    ('literacy_rate', _RATIO),
+    ('Male_literacy_rate', _RATIO),
+    ('Female_literacy_rate', _RATIO),
+    ('State_District', pa.dictionary(pa.int32(), pa.string())),
+])
+
+CENTROIDS_SCHEMA = pa.schema([
+    ('State', pa.string()),
+    ('Longitude', pa.float32()),
+    ('Latitude', pa.float32()),
+])
+
+# Columns that are computed during ingestion rather than read from the CSV
+_DERIVED = {'State_District'}
+# Columns that must be present on every row
+_REQUIRED = {'State', 'District'}
+
+
+def _signature(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _snapshot_path(source, version):
+    stem = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(CACHE_DIR, f"{stem}-{version[:16]}-v{SNAPSHOT_LAYOUT}.arrow")
+
+
+def _changes_path(source, version):
+    # Revisions applied on top of one snapshot of a source file, one JSON line per apply_changes() call
+    stem = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(CACHE_DIR, f"{stem}-{version[:16]}-changes.jsonl")
+
+
+def _head_path(source, version):
+    # Names the snapshot holding the latest compacted revision of one version of a source file
+    stem = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(CACHE_DIR, f"{stem}-{version[:16]}-head.json")
+
+
+@functools.lru_cache(maxsize=None)
+def _code_version():
+    # Hash of the code and libraries behind the pickled artifacts, so a change to the classes or
+    # dicts they are made of never restores artifacts built by other code
+    digest = hashlib.sha1(f"{pd.__version__}:{np.__version__}:{pa.__version__}".encode())
+    for name in _ARTIFACT_SOURCES:
+        with open(os.path.join(BASE_DIR, name), 'rb') as handle:
+            digest.update(handle.read())
+    return digest.hexdigest()
+
+
+def _artifacts_path(version):
+    stem = os.path.splitext(os.path.basename(CENSUS_PATH))[0]
+    return os.path.join(CACHE_DIR, f"{stem}-derived-{version}-{_code_version()[:12]}.pickle")
+
+
+def _add_derived(table):
+    if 'State_District' not in table.column_names:
+        state = table['State'].cast(pa.string())
+        district = table['District'].cast(pa.string())
+        table = table.append_column('State_District', pc.binary_join_element_wise(state, district, ' --- '))
+    return table
+
+
+def validate(table, schema):
+    """
+    Checks a parsed table against a schema and casts it to the schema's types.
+
+    Raises ValueError when columns are missing or unexpected, when a value does not
+    fit its column type, or when a required key column has empty values.
+
+    Parameters:
+    - table (pyarrow.Table): The parsed table.
+    - schema (pyarrow.Schema): The expected layout.
+    """
+    missing = [name for name in schema.names if name not in table.column_names]
+    unexpected = [name for name in table.column_names if name not in schema.names]
+    if missing or unexpected:
+        raise ValueError(f"Schema mismatch: missing columns {missing}, unexpected columns {unexpected}")
+    columns = []
+    for field in schema:
+        column = table[field.name]
+        if field.name in _REQUIRED and column.null_count:
+            raise ValueError(f"Column '{field.name}' has {column.null_count} empty values")
+        try:
+            columns.append(column.cast(field.type))
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as error:
+            raise ValueError(f"Column '{field.name}' does not fit {field.type}: {error}") from error
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def _partition_rows(table):
+    # Stable sort so every state, and every district inside it, is one contiguous block
+    keys = pa.table({'State': table['State'].cast(pa.string()), 'District': table['District'].cast(pa.string())})
+    return table.take(pc.sort_indices(keys, sort_keys=[('State', 'ascending'), ('District', 'ascending')]))
+
+
+def _read_source(source, schema):
+    table = pacsv.read_csv(source)
+    if 'ilist' in table.column_names:
+        table = table.drop_columns(['ilist'])
+    if schema is CENSUS_SCHEMA:
+        table = _partition_rows(_add_derived(table))
+    return validate(table, schema)
+
+
+def ingest(source, schema, version=None):
+    """
+    Converts a CSV file into a validated Arrow IPC snapshot that can be memory-mapped.
+
+    Parameters:
+    - source (str): The CSV file to convert.
+    - schema (pyarrow.Schema): The layout the file must match.
+    - version (str): Content hash of the source; computed when not given.
+
+    Returns:
+    - str: Path of the written snapshot.
+    """
+    version = version or _file_hash(source)
+    table = _read_source(source, schema)
+    target = _snapshot_path(source, version)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    partial = f"{target}.{os.getpid()}.tmp"
+    with pa.OSFile(partial, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(partial, target)
+    # Drop snapshots of earlier versions of the same file
+    stem = os.path.splitext(os.path.basename(source))[0]
+    for stale in glob.glob(os.path.join(CACHE_DIR, f"{stem}-*.arrow")):
+        if stale != target:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+    return target
+
+
+class _Dataset:
+    """
+    A loaded table: the Arrow columns (memory-mapped when a snapshot is available)
+    and the pandas columns converted from them so far.
+
+    `base` is the content hash of the source file and `version` changes with every revision
+    applied on top of it. `head` is the version of the snapshot the table was opened from,
+    which differs from `base` once revisions have been compacted; `log_size` is how much of
+    that snapshot's revision log has been applied.
+    """
+
+    def __init__(self, signature, version, table, log_path=None, head_path=None):
+        self.signature = signature
+        self.base = version
+        self.version = version
+        self.head = version
+        self.table = table
+        self.log_path = log_path
+        self.log_size = 0
+        self.head_path = head_path
+        self.head_signature = None
+        self._series = {}
+        self._derived = {}
+        self._lock = threading.Lock()
+        self.restored = False
+
+    def column(self, name):
+        series = self._series.get(name)
+        if series is None and name not in self.table.column_names and _computed(name) is not None:
+            # Computed from stored columns, so outside the lock that guards their conversion
+            with tr.span(f"data.column:{name}"):
+                series = _COLUMNS[name](self)
+            series.name = name
+            with self._lock:
+                series = self._series.setdefault(name, series)
+        if series is None:
+            with self._lock:
+                series = self._series.get(name)
+                if series is None:
+                    # Single-chunk numeric columns are wrapped without copying the mapped buffer
+                    with tr.span(f"data.column:{name}"):
+                        series = self.table[name].to_pandas()
+                    series.name = name
+                    self._series[name] = series
+        return series
+
+    def frame(self, columns=None):
+        names = self.table.column_names if columns is None else list(dict.fromkeys(columns))
+        unknown = [name for name in names if name not in self.table.column_names and _computed(name) is None]
+        if unknown:
+            raise KeyError(f"Unknown census columns: {unknown}")
+        return pd.concat([self.column(name) for name in names], axis=1)
+
+    def restore(self, path):
+        """
+        Adds the artifacts persisted by persist_derived() to this dataset, if the file exists.
+
+        Parameters:
+        - path (str): The artifact snapshot of this dataset version.
+        """
+        try:
+            with tr.span("data.restore"), open(path, 'rb') as handle:
+                stored = pickle.load(handle)
+        except (OSError, pickle.UnpicklingError, AttributeError, EOFError, ImportError):
+            # Missing, partial or written by other code: the artifacts are rebuilt on use
+            stored = {}
+        with self._lock:
+            for name, value in stored.items():
+                self._derived.setdefault(name, value)
+            self.restored = True
+
+    def derived(self, name, builder):
+        """
+        Returns an artifact computed from this dataset, building it on first use.
+
+        Parameters:
+        - name (str): Cache key of the artifact.
+        - builder (callable): Called with this dataset to build the artifact.
+        """
+        if name not in self._derived:
+            with tr.span(f"derived:{name}"):
+                value = builder(self)
+            with self._lock:
+                self._derived.setdefault(name, value)
+        return self._derived[name]
+
+
+class _Partition:
+    """
+    Row ranges of each state in the State-sorted census table, and of each district
+    relative to its state's first row.
+    """
+
+    def __init__(self, dataset=None):
+        self.states = {}
+        self.districts = {}
+        if dataset is not None:
+            self._add(dataset.column('State'), dataset.column('District'), 0)
+
+    def _add(self, state, district, offset):
+        # Indexes State-sorted rows that start at row `offset` of the table
+        new_state = np.diff(state.cat.codes.to_numpy()) != 0
+        new_district = new_state | (np.diff(district.cat.codes.to_numpy()) != 0)
+        state_names = state.to_numpy()
+        district_names = district.to_numpy()
+        for start, stop in self._spans(new_state, len(state)):
+            name = state_names[start]
+            self.states[name] = (offset + start, offset + stop)
+            self.districts[name] = {}
+        for start, stop in self._spans(new_district, len(state)):
+            name = state_names[start]
+            first = self.states[name][0] - offset
+            self.districts[name][district_names[start]] = (start - first, stop - first)
+
+    def updated(self, dataset, change):
+        """
+        Returns the partition of a revised dataset: the changed states are indexed again and
+        the other states keep their district ranges at their new position.
+
+        Parameters:
+        - dataset: The revised dataset.
+        - change (_Change): What the revision changed.
+        """
+        result = _Partition()
+        for state, (start, stop) in change.after.items():
+            if state in change.states:
+                rows = _decoded(dataset.table.slice(start, stop - start).select(['State', 'District']))
+                result._add(rows['State'].astype('category'), rows['District'].astype('category'), start)
+            else:
+                result.states[state] = (start, stop)
+                result.districts[state] = self.districts[state]
+        return result
+
+    @staticmethod
+    def _spans(changes, length):
+        starts = np.flatnonzero(np.concatenate(([length > 0], changes)))
+        stops = np.append(starts[1:], length)
+        return zip(starts.tolist(), stops.tolist())
+
+
+class _Change:
+    """
+    What one revision changed: `states` are the states whose rows were upserted or deleted,
+    `before` and `after` map every state to its (start, stop) row range in the previous and
+    in the revised table (in table order; states left without rows are not in `after`).
+    """
+
+    def __init__(self, states, before, after):
+        self.states = states
+        self.before = before
+        self.after = after
+
+
+# Incremental maintenance of derived artifacts: name prefix -> update(name, artifact, dataset, change)
+# Computed columns: name -> builder called with a _Dataset, returning a Series aligned with its rows
+_COLUMNS = {}
+
+_UPDATERS = {'partition': lambda name, index, dataset, change: index.updated(dataset, change)}
+
+
+def register_updater(prefix, update):
+    """
+    Registers how derived artifacts are brought up to date after a revision. Artifacts
+    without an updater are dropped and rebuilt on next use.
+
+    Parameters:
+    - prefix (str): Artifacts whose name starts with this prefix are updated.
+    - update (callable): Called as update(name, artifact, dataset, change) with the revised
+      dataset and a _Change; returns the artifact for the revised dataset, or None to drop it.
+    """
+    _UPDATERS[prefix] = update
+
+
+def register_column(name, build):
+    """
+    Registers a column computed from the stored census columns, e.g. a derived metric. It can
+    be requested wherever census columns can and is computed once per dataset version, on
+    first use.
+
+    Parameters:
+    - name (str): The column name; must not be a stored column.
+    - build (callable): Called with the dataset; returns a Series with one value per row.
+    """
+    if name in CENSUS_SCHEMA.names:
+        raise ValueError(f"'{name}' is a stored census column")
+    _COLUMNS[name] = build
+
+
+def _plain(table):
+    # Plain string columns instead of dictionary ones, whose dictionaries span the whole table
+    fields = [pa.field(field.name, field.type.value_type) if pa.types.is_dictionary(field.type) else field
+              for field in table.schema]
+    return table.cast(pa.schema(fields))
+
+
+def _computed(name):
+    # The builder of a computed column, or None. Metrics registers the default derived metrics
+    # when it is imported, which callers that only import DataStore may not have done yet
+    if name not in _COLUMNS:
+        import Metrics  # noqa: F401
+    return _COLUMNS.get(name)
+
+
+def _decoded(table):
+    return _plain(table).to_pandas()
+
+
+def _revision_table(rows):
+    # Validated census rows from a DataFrame or a list of records with the India.csv columns
+    if rows is None or len(rows) == 0:
+        return CENSUS_SCHEMA.empty_table()
+    if isinstance(rows, pd.DataFrame):
+        table = pa.Table.from_pandas(rows, preserve_index=False)
+    else:
+        table = pa.Table.from_pylist(list(rows))
+    if 'ilist' in table.column_names:
+        table = table.drop_columns(['ilist'])
+    table = validate(_add_derived(table.drop_columns([name for name in _DERIVED if name in table.column_names])),
+                     CENSUS_SCHEMA)
+    if table['District code'].null_count:
+        raise ValueError("Revised rows need a 'District code'")
+    keys = list(zip(table['State'].to_pylist(), table['District code'].to_pylist()))
+    if len(set(keys)) != len(keys):
+        raise ValueError("Revised rows repeat a (State, District code) key")
+    return table
+
+
+def _apply(dataset, upserts, deletes, digest):
+    """
+    Returns a new dataset with one revision applied. Only the rows of the affected states
+    are rebuilt: the other states are zero-copy slices of the previous table, the columns
+    converted so far are carried over, and registered derived artifacts are updated instead
+    of rebuilt.
+
+    Parameters:
+    - dataset: The dataset to revise; it is left unchanged for readers still using it.
+    - upserts (pyarrow.Table): Validated rows replacing or adding (State, District code) keys.
+    - deletes (list): (State, District code) keys to remove; unknown keys are ignored.
+    - digest (str): Identifies the revision; chained into the dataset version.
+    """
+    index = partition(dataset)
+    removed = {}
+    for state, code in list(zip(upserts['State'].to_pylist(), upserts['District code'].to_pylist())) + deletes:
+        removed.setdefault(state, set()).add(code)
+    table = dataset.table
+    # [revised rows or None, start, stop]: None keeps the rows start:stop of the previous table
+    pieces = []
+    after = {}
+    position = 0
+    for state in sorted(set(index.states) | set(removed)):
+        start, stop = index.states.get(state, (0, 0))
+        count = stop - start
+        if state in removed:
+            rows = table.slice(start, count)
+            keep = pc.invert(pc.is_in(rows['District code'], pa.array(sorted(removed[state]), pa.int32())))
+            added = upserts.filter(pc.equal(upserts['State'].cast(pa.string()), state))
+            # Sorted as plain strings and encoded again, so the state's rows get a dictionary of their own
+            # instead of one merged from the whole table's
+            rows = _partition_rows(pa.concat_tables([_plain(rows.filter(keep)), _plain(added)]))
+            rows = rows.cast(CENSUS_SCHEMA)
+            count = rows.num_rows
+            if count:
+                pieces.append([rows, start, stop])
+        elif pieces and pieces[-1][0] is None and pieces[-1][2] == start:
+            # Consecutive unchanged states stay one slice
+            pieces[-1][2] = stop
+        else:
+            pieces.append([None, start, stop])
+        if count:
+            after[state] = (position, position + count)
+            position += count
+    # Unchanged states are not copied; compaction combines the chunks when it writes the snapshot
+    revised = pa.concat_tables([table.slice(start, stop - start) if rows is None else rows
+                                for rows, start, stop in pieces]) if pieces else table.slice(0, 0)
+
+    result = _Dataset(dataset.signature, dataset.base, revised, dataset.log_path, dataset.head_path)
+    result.version = hashlib.sha1(f"{dataset.version}:{digest}".encode()).hexdigest()
+    result.head = dataset.head
+    result.log_size = dataset.log_size
+    result.head_signature = dataset.head_signature
+    result.restored = dataset.restored
+    change = _Change(set(removed), dict(index.states), after)
+    with dataset._lock:
+        artifacts = dict(dataset._derived)
+        series = dict(dataset._series)
+    if series and pieces:
+        # Each revised piece is converted once, for every column carried over
+        pieces = [[None if rows is None else _Dataset(None, None, _plain(rows)), start, stop]
+                  for rows, start, stop in pieces]
+        for name, column in series.items():
+            result._series[name] = _spliced(name, column, pieces)
+    # The partition first: the other updaters read it
+    for name in sorted(artifacts, key=lambda name: name != 'partition'):
+        update = next((update for prefix, update in _UPDATERS.items() if name.startswith(prefix)), None)
+        if update is not None:
+            with tr.span(f"derived.update:{name}"):
+                value = update(name, artifacts[name], result, change)
+            if value is not None:
+                result._derived[name] = value
+    return result
+
+
+def _spliced(name, series, pieces):
+    # A converted column of the revised table: slices of the previous one for unchanged rows,
+    # converted from the revised rows (a dataset of plain columns) otherwise
+    parts = [series.iloc[start:stop] if rows is None else rows.column(name) for rows, start, stop in pieces]
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        return pd.concat(parts, ignore_index=True).rename(name)
+    # Categories of the revised rows are appended, so the previous codes stay valid
+    dtype = series.dtype
+    revised = [part for part, (rows, _, _) in zip(parts, pieces) if rows is not None]
+    values = pd.Index(pd.unique(pd.concat(revised).dropna()))
+    added = values[dtype.categories.get_indexer(values) < 0]
+    if len(added):
+        dtype = pd.CategoricalDtype(dtype.categories.append(added))
+    codes = np.concatenate([part.cat.codes.to_numpy() if rows is None else dtype.categories.get_indexer(part)
+                            for part, (rows, _, _) in zip(parts, pieces)])
+    return pd.Series(pd.Categorical.from_codes(codes, dtype=dtype), name=name)
+
+
+def _replay(dataset):
+    """
+    Returns the dataset with the revisions logged since it was loaded applied, including
+    revisions appended by other processes.
+
+    Parameters:
+    - dataset: The dataset to bring up to date.
+    """
+    if dataset.log_path is None:
+        return dataset
+    try:
+        size = os.path.getsize(dataset.log_path)
+    except OSError:
+        return dataset
+    if size <= dataset.log_size:
+        return dataset
+    with open(dataset.log_path, 'rb') as handle:
+        handle.seek(dataset.log_size)
+        data = handle.read(size - dataset.log_size)
+    # A line still being written by another process is applied on a later call
+    complete = data[:data.rfind(b'\n') + 1]
+    for line in complete.splitlines():
+        entry = json.loads(line)
+        dataset = _apply(dataset, _revision_table(entry['upserts']),
+                         [(state, int(code)) for state, code in entry['deletes']],
+                         hashlib.sha1(line).hexdigest())
+    dataset.log_size += len(complete)
+    return dataset
+
+
+def _mapped(snapshot, schema):
+    # The table of a snapshot, memory-mapped; None when it is missing or has another layout
+    try:
+        table = pa.ipc.open_file(pa.memory_map(snapshot)).read_all()
+    except (OSError, pa.ArrowInvalid):
+        return None
+    return table if table.schema.equals(schema) else None
+
+
+def _open(source, schema, version):
+    snapshot = _snapshot_path(source, version)
+    if not os.path.exists(snapshot):
+        try:
+            snapshot = ingest(source, schema, version)
+        except OSError:
+            # Read-only deployment: keep the parsed table in memory instead
+            return _read_source(source, schema)
+    table = _mapped(snapshot, schema)
+    return _read_source(source, schema) if table is None else table
+
+
+def _read_head(head_path):
+    # (file signature, compacted version) of a head file; (None, None) when there is none
+    try:
+        signature = _signature(head_path)
+        with open(head_path) as handle:
+            return signature, json.load(handle)['version']
+    except (OSError, ValueError, KeyError, TypeError):
+        return None, None
+
+
+def _open_dataset(source, schema, signature, version):
+    # A census file opens at its latest compacted snapshot, so only revisions logged since are replayed
+    if schema is not CENSUS_SCHEMA:
+        with tr.span(f"data.load:{os.path.basename(source)}"):
+            return _Dataset(signature, version, _open(source, schema, version))
+    head_path = _head_path(source, version)
+    head_signature, head = _read_head(head_path)
+    with tr.span(f"data.load:{os.path.basename(source)}"):
+        table = _mapped(_snapshot_path(source, head), schema) if head else None
+        if table is None:
+            head = version
+            table = _open(source, schema, version)
+    dataset = _Dataset(signature, version, table, _changes_path(source, head), head_path)
+    dataset.version = dataset.head = head
+    dataset.head_signature = head_signature
+    return dataset
+
+
+def _compact(source, dataset):
+    """
+    Writes a revised dataset as the snapshot of its version and points the head file at it,
+    so processes started later memory-map it instead of replaying the revisions. Revisions
+    are logged against the new snapshot from then on and the previous log is removed.
+    Returns the dataset reading the new snapshot, with the same derived artifacts.
+
+    Called with the revision lock held and every logged revision replayed, so nothing can be
+    appended to the previous log before it is removed.
+
+    Parameters:
+    - source (str): The source CSV file.
+    - dataset: The dataset with every logged revision applied.
+    """
+    if dataset.head == dataset.version:
+        return dataset
+    target = _snapshot_path(source, dataset.version)
+    log_path = _changes_path(source, dataset.version)
+    try:
+        with tr.span("data.compact"):
+            partial = f"{target}.{os.getpid()}.tmp"
+            # IPC files hold one dictionary per column, so the revised chunks are combined first
+            table = dataset.table.combine_chunks()
+            with pa.OSFile(partial, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            os.replace(partial, target)
+            partial = f"{dataset.head_path}.{os.getpid()}.tmp"
+            with open(partial, 'w') as handle:
+                json.dump({'version': dataset.version}, handle)
+            os.replace(partial, dataset.head_path)
+    except OSError:
+        # Read-only or full cache directory: keep replaying the log
+        return dataset
+    stale = [dataset.log_path] + ([_snapshot_path(source, dataset.head)] if dataset.head != dataset.base else [])
+    for path in stale:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    mapped = _mapped(target, table.schema)
+    compacted = _Dataset(dataset.signature, dataset.base, table if mapped is None else mapped,
+                         log_path, dataset.head_path)
+    compacted.version = compacted.head = dataset.version
+    compacted.head_signature = _read_head(dataset.head_path)[0]
+    compacted.restored = dataset.restored
+    with dataset._lock:
+        compacted._derived = dict(dataset._derived)
+    return compacted
+
+
+# One _Dataset per source file
+_cache = {}
+# Re-entrant, as apply_changes() loads the census while holding it
+_lock = threading.RLock()
+
+
+@contextlib.contextmanager
+def _revision_lock(source):
+    # Serializes logging, replaying and compacting the revisions of a source file between the
+    # threads of this process and, with an advisory lock on a file next to the snapshots, between processes
+    stem = os.path.splitext(os.path.basename(source))[0]
+    with _lock:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(os.path.join(CACHE_DIR, f"{stem}.lock"), 'a') as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            yield
+
+
+def _load(source, schema):
+    """
+    Returns the cached dataset for a source file, re-opening it only when the file's
+    mtime/size changed and its content hash differs from the cached one.
+
+    Parameters:
+    - source (str): The source CSV file.
+    - schema (pyarrow.Schema): The layout the file must match.
+    """
+    signature = _signature(source)
+    dataset = _cache.get(source)
+    if (dataset is not None and dataset.signature == signature and not _log_grew(dataset)
+            and not _head_moved(dataset)):
+        return dataset
+    with _lock:
+        dataset = _cache.get(source)
+        if dataset is None or dataset.signature != signature:
+            version = _file_hash(source)
+            if dataset is not None and dataset.base == version:
+                # Touched but unchanged: keep the columns we already have
+                dataset.signature = signature
+            else:
+                dataset = _open_dataset(source, schema, signature, version)
+        if _head_moved(dataset):
+            # Another process compacted the revisions into a new snapshot
+            head_signature, head = _read_head(dataset.head_path)
+            if head == dataset.version:
+                # This process already applied them: continue with the new snapshot's log
+                dataset.head, dataset.head_signature = head, head_signature
+                dataset.log_path, dataset.log_size = _changes_path(source, head), 0
+            else:
+                dataset = _open_dataset(source, schema, dataset.signature, dataset.base)
+        dataset = _replay(dataset)
+        _cache[source] = dataset
+    return dataset
+
+
+def _log_grew(dataset):
+    if dataset.log_path is None:
+        return False
+    try:
+        return os.path.getsize(dataset.log_path) > dataset.log_size
+    except OSError:
+        return False
+
+
+def _head_moved(dataset):
+    if dataset.head_path is None:
+        return False
+    try:
+        return _signature(dataset.head_path) != dataset.head_signature
+    except OSError:
+        return dataset.head_signature is not None
+
+
+def _census():
+    dataset = _load(CENSUS_PATH, CENSUS_SCHEMA)
+    if not dataset.restored:
+        # Derived artifacts can depend on every source file, so they are keyed on dataset_version()
+        dataset.restore(_artifacts_path(dataset_version()))
+    return dataset
+
+
+def census(columns=None):
+    """
+    Returns the census table shared by every session of this process.
+
+    Only the requested columns are materialized; they are read from a memory-mapped
+    Arrow snapshot of India.csv that is rebuilt when the CSV changes. Callers get a
+    copy-on-write frame, so adding or overwriting columns never affects other sessions.
+
+    Parameters:
+    - columns (list): The columns to return. All columns when omitted.
+    """
+    return _census().frame(columns)
+
+
+def centroids(columns=None):
+    """
+    Returns the state centroid table (State, Longitude, Latitude) shared by every session.
+
+    Parameters:
+    - columns (list): The columns to return. All columns when omitted.
+    """
+    return _load(CENTROIDS_PATH, CENTROIDS_SCHEMA).frame(columns)
+
+
+def dataset_version():
+    """
+    Returns a content hash identifying the currently loaded census and centroid data,
+    including the revisions applied with apply_changes().
+    """
+    return _load(CENSUS_PATH, CENSUS_SCHEMA).version[:12] + _load(CENTROIDS_PATH, CENTROIDS_SCHEMA).version[:12]
+
+
+def apply_changes(upserts=None, deletes=None):
+    """
+    Revises census rows without re-reading India.csv. Rows are keyed on (State, District code),
+    as district codes repeat across states.
+
+    Only the affected states are rebuilt: their rows, partition ranges, state cube rows,
+    rankings and state versions. Every session of every process sees the revision; it is
+    logged next to the snapshots. Once the log reaches COMPACT_BYTES, the revised table is
+    written as a new snapshot that later processes memory-map instead of replaying the log
+    (see compact()). Revisions are dropped when India.csv itself changes.
+
+    Parameters:
+    - upserts (DataFrame or list of dict): Rows with the India.csv columns. Each row replaces
+      the row with the same State and District code, or is added as a new district.
+    - deletes (list): (State, District code) pairs to remove; unknown pairs are ignored.
+
+    Returns:
+    - list: The affected states.
+    """
+    table = _revision_table(upserts)
+    deletes = [(str(state), int(code)) for state, code in deletes or ()]
+    source_columns = [name for name in CENSUS_SCHEMA.names if name not in _DERIVED]
+    entry = {'upserts': table.select(source_columns).to_pylist(), 'deletes': deletes}
+    with _revision_lock(CENSUS_PATH):
+        # The head only moves while the lock is held, so this is the log revisions are replayed from
+        dataset = _census()
+        known = set(partition(dataset).states)
+        with open(dataset.log_path, 'a') as handle:
+            handle.write(json.dumps(entry) + '\n')
+        revised = _census()
+        if revised.log_size >= COMPACT_BYTES:
+            _cache[CENSUS_PATH] = _compact(CENSUS_PATH, revised)
+    return sorted(set(table['State'].cast(pa.string()).to_pylist()) | {state for state, _ in deletes if state in known})
+
+
+def compact():
+    """
+    Writes the census with every logged revision applied as a new Arrow snapshot and starts
+    an empty revision log, so later process starts memory-map it instead of replaying the
+    revisions. Does nothing when no revision was logged since the last compaction.
+
+    Returns:
+    - str: The dataset version of the snapshot.
+    """
+    with _revision_lock(CENSUS_PATH):
+        dataset = _compact(CENSUS_PATH, _census())
+        _cache[CENSUS_PATH] = dataset
+    return dataset.version
+
+
+def _state_versions(dataset, states=(), previous=None):
+    # Order-sensitive combination of the content hashes of each state's rows; with `previous`,
+    # only the given states and states missing from it are hashed again
+    index = partition(dataset)
+    previous = previous or {}
+    versions = {state: previous[state] for state in index.states if state in previous and state not in states}
+    stale = [state for state in index.states if state not in versions]
+    if stale:
+        spans = [index.states[state] for state in stale]
+        rows = pa.concat_tables([dataset.table.slice(start, stop - start) for start, stop in spans])
+        # Strings hash like the categories they decode from, so versions do not depend on the dictionary
+        hashes = pd.util.hash_pandas_object(_decoded(rows), index=False).to_numpy()
+        offset = 0
+        for state, (start, stop) in zip(stale, spans):
+            part = hashes[offset:offset + stop - start]
+            offset += stop - start
+            weights = np.arange(1, 2 * len(part) + 1, 2, dtype='uint64')
+            versions[state] = f"{int((part * weights).sum(dtype='uint64')):016x}"
+    return {state: versions[state] for state in index.states}
+
+
+register_updater('state_versions',
+                 lambda name, versions, dataset, change: _state_versions(dataset, change.states, versions))
+
+
+def state_version(state):
+    """
+    Returns a content hash of one state's census rows. It only changes when a revision
+    touches the state, so caches of single-state views keyed on it survive revisions of
+    other states.
+
+    Parameters:
+    - state (str): The state.
+    """
+    return derived('state_versions', _state_versions).get(state) or dataset_version()
+
+
+def derived(name, builder):
+    """
+    Returns an artifact computed from the current census dataset, building it once per
+    dataset version. Builders receive the dataset and read columns with dataset.column().
+
+    Parameters:
+    - name (str): Cache key of the artifact.
+    - builder (callable): Called with the dataset to build the artifact.
+    """
+    return _census().derived(name, builder)
+
+
+def persist_derived():
+    """
+    Writes the derived artifacts built so far (partition index, state cube, rankings)
+    next to the Arrow snapshots, so later processes load them instead of rebuilding them.
+    The file is keyed on the dataset version and on the code of the modules that build the
+    artifacts; files of other versions or other code are removed.
+
+    Returns:
+    - str: Path of the written file.
+    """
+    dataset = _census()
+    target = _artifacts_path(dataset_version())
+    with dataset._lock:
+        artifacts = dict(dataset._derived)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    partial = f"{target}.{os.getpid()}.tmp"
+    with open(partial, 'wb') as handle:
+        pickle.dump(artifacts, handle, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(partial, target)
+    stem = os.path.splitext(os.path.basename(CENSUS_PATH))[0]
+    for stale in glob.glob(os.path.join(CACHE_DIR, f"{stem}-derived-*.pickle")):
+        if stale != target:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+    return target
+
+
+def partition(dataset=None):
+    """
+    Returns the partition index of the census table: `states` maps each state to its
+    (start, stop) row range and `districts` maps each state to {District: (start, stop)},
+    with district ranges relative to the state's first row.
+
+    Parameters:
+    - dataset: The dataset handed to a derived() builder. The current dataset when omitted.
+    """
+    if dataset is None:
+        dataset = _census()
+    return dataset.derived('partition', _Partition)
+
+
+def states():
+    """
+    Returns the state names in the order of the census table.
+    """
+    return list(partition().states)
+
+
+def state_slice(state, columns=None):
+    """
+    Returns the census rows of one state as a zero-copy slice of the shared table.
+
+    Parameters:
+    - state (str): The state to return.
+    - columns (list): The columns to return. All columns when omitted.
+    """
+    start, stop = partition().states.get(state, (0, 0))
+    return census(columns).iloc[start:stop]
+
+
+def district_rows(state, district, columns=None):
+    """
+    Returns the census rows of one district of a state without scanning the table.
+
+    Most districts have a single row; a few district names appear twice within a state.
+
+    Parameters:
+    - state (str): The state containing the district.
+    - district (str): The district to return.
+    - columns (list): The columns to return. All columns when omitted.
+    """
+    index = partition()
+    first, _ = index.states.get(state, (0, 0))
+    start, stop = index.districts.get(state, {}).get(district, (0, 0))
+    return census(columns).iloc[first + start:first + stop]
+
+
+def districts(state):
+    """
+    Returns the distinct district names of a state.
+
+    Parameters:
+    - state (str): The state to list.
+    """
+    return list(partition().districts.get(state, {}))
+
+
+def metric_columns():
+    """
+    Returns the numeric census columns that can be selected as a category.
+    """
+    names = CENSUS_SCHEMA.names
+    return [name for name in names[names.index('Population'):] if name not in _DERIVED]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write the Arrow snapshots, or revise census rows.')
+    parser.add_argument('--upsert', help='CSV file of rows (India.csv columns) to add or replace')
+    parser.add_argument('--delete', nargs='+', default=[], metavar='STATE:CODE',
+                        help='rows to remove, e.g. "Kerala:595"')
+    arguments = parser.parse_args()
+    if arguments.upsert or arguments.delete:
+        revised = apply_changes(pd.read_csv(arguments.upsert) if arguments.upsert else None,
+                                [item.rsplit(':', 1) for item in arguments.delete])
+        print(f"Revised states: {', '.join(revised)}")
+    else:
+        for source, schema in ((CENSUS_PATH, CENSUS_SCHEMA), (CENTROIDS_PATH, CENTROIDS_SCHEMA)):
+            print(ingest(source, schema))
@@ -0,0 +1,134 @@
+import io
+import os
+import zlib
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import DataStore as ds
+from FigureCache import LRUCache
+
+# Export formats: name -> (label, file extension, MIME type)
+FORMATS = {
+    'csv': ('CSV', 'csv', 'text/csv'),
+    'csv.gz': ('Compressed CSV (gzip)', 'csv.gz', 'application/gzip'),
+    'parquet': ('Parquet', 'parquet', 'application/vnd.apache.parquet'),
+}
+# Rows serialized per chunk (and per Parquet row group)
+CHUNK_ROWS = 50_000
+# Memory budget for finished exports shared by all sessions, in megabytes
+BUDGET_MB = float(os.environ.get('CENSUS_EXPORT_CACHE_MB', '64'))
+
+# Columns every export starts with, whatever metrics are selected
+KEY_COLUMNS = ['State', 'District', 'District code']
+
+_cache = LRUCache(int(BUDGET_MB * 1024 * 1024))
+
+
+class _Sink(io.RawIOBase):
+    # Write-only file that hands out what was written since the last drain()
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _selection(states, columns):
+    columns = None if columns is None else list(dict.fromkeys(KEY_COLUMNS + list(columns)))
+    if not states:
+        return ds.census(columns)
+    return pd.concat([ds.state_slice(state, columns) for state in states])
+
+
+def _csv_chunks(frame, chunk_rows):
+    for start in range(0, max(len(frame), 1), chunk_rows):
+        yield frame.iloc[start:start + chunk_rows].to_csv(index=False, header=(start == 0)).encode()
+
+
+def iter_export(fmt, states=None, columns=None, chunk_rows=CHUNK_ROWS):
+    """
+    Serializes census rows chunk by chunk, so callers can stream an export without
+    holding the whole file in memory.
+
+    Parameters:
+    - fmt (str): One of FORMATS ('csv', 'csv.gz' or 'parquet').
+    - states (list): Only export these states. All states when empty.
+    - columns (list): Metrics to export after the State/District key columns. All columns when omitted.
+    - chunk_rows (int): Rows serialized per chunk.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}'; expected one of {list(FORMATS)}")
+    frame = _selection(states, columns)
+    if fmt == 'csv':
+        yield from _csv_chunks(frame, chunk_rows)
+    elif fmt == 'csv.gz':
+        compressor = zlib.compressobj(wbits=31)
+        for chunk in _csv_chunks(frame, chunk_rows):
+            yield compressor.compress(chunk)
+        yield compressor.flush()
+    else:
+        sink = _Sink()
+        writer = None
+        for start in range(0, max(len(frame), 1), chunk_rows):
+            table = pa.Table.from_pandas(frame.iloc[start:start + chunk_rows], preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(sink, table.schema)
+            writer.write_table(table)
+            yield sink.drain()
+        writer.close()
+        yield sink.drain()
+
+
+def export_bytes(fmt, states=None, columns=None):
+    """
+    Returns a complete export, serializing it only the first time a selection is requested
+    for the current dataset version.
+
+    Parameters:
+    - fmt (str): One of FORMATS ('csv', 'csv.gz' or 'parquet').
+    - states (list): Only export these states. All states when empty.
+    - columns (list): Metrics to export after the State/District key columns. All columns when omitted.
+    """
+    # Exports of selected states are only invalidated by revisions of those states
+    version = tuple(ds.state_version(state) for state in states) if states else ds.dataset_version()
+    key = (fmt, tuple(states or ()), None if columns is None else tuple(columns), version)
+    data = _cache.get(key)
+    if data is None:
+        data = b''.join(iter_export(fmt, states, columns))
+        _cache.put(key, data)
+    return data
+
+
+def file_name(fmt):
+    """
+    Returns the download file name for an export format.
+
+    Parameters:
+    - fmt (str): One of FORMATS.
+    """
+    return f"india_census_2011.{FORMATS[fmt][1]}"
+
+
+def stats():
+    """
+    Returns hit, miss and eviction counters plus the current size of the export cache.
+    """
+    return _cache.stats()
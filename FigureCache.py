@@ -0,0 +1,114 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import DataStore as ds
+
+# Memory budget for serialized figures shared by all sessions, in megabytes
+BUDGET_MB = float(os.environ.get('CENSUS_FIGURE_CACHE_MB', '64'))
+
+
+class LRUCache:
+    """
+    Least-recently-used store of serialized payloads (str or bytes) bounded by their total size.
+    """
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            text = self._entries.get(key)
+            if text is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return text
+
+    def put(self, key, text):
+        size = len(text)
+        if size > self.budget_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= len(self._entries.pop(key))
+            self._entries[key] = text
+            self._bytes += size
+            while self._bytes > self.budget_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'budget_bytes': self.budget_bytes,
+            }
+
+
+_cache = LRUCache(int(BUDGET_MB * 1024 * 1024))
+
+
+def _normalize(value):
+    # Canonical, hashable form of a renderer argument
+    if isinstance(value, pd.DataFrame):
+        return 'frame', value.shape, int(pd.util.hash_pandas_object(value).sum())
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize(item) for item in value)
+    return value
+
+
+def figure_json(renderer, build, *args, state=None):
+    """
+    Returns the serialized figure of a renderer, building it only on a cache miss.
+
+    Parameters:
+    - renderer (str): Name of the renderer, part of the cache key.
+    - build (callable): Builds the Plotly figure from args.
+    - args: Renderer arguments, part of the cache key together with the dataset version.
+    - state (str): For figures drawn from one state's rows only: key on that state's version,
+      so revisions of other states keep the entry valid.
+    """
+    version = ds.dataset_version() if state is None else ds.state_version(state)
+    key = (renderer, _normalize(args), version)
+    text = _cache.get(key)
+    if text is None:
+        text = build(*args).to_json()
+        _cache.put(key, text)
+    return text
+
+
+def stats():
+    """
+    Returns hit, miss and eviction counters plus the current size of the figure cache.
+    """
+    return _cache.stats()
+
+
+def clear():
+    """
+    Drops every cached figure.
+    """
+    _cache.clear()
@@ -1,10 +1,48 @@
+import numpy as np
 import pandas as pd
-import plotly.express as px
-import streamlit as st
 
-# Load the data
-final_df = pd.read_csv('India.csv')
-state_df = pd.read_csv('Latitude and Longitude State wise centroids 2020.csv')
+import DataStore as ds
+import FigureCache as fc
+import Instrumentation as tr
+import MapLOD as lod
+import Metrics as dm
+import Payload as pl
+import Ranking as rk
+import Similarity as si
+import Spatial as sp
+
+
+def _build(build, *args):
+    # Builders import plotly.express themselves: it is the slowest import of the app and
+    # is only needed once a figure misses the cache
+    with tr.span(f"build:{build.__name__}"):
+        fig = build(*args)
+    return pl.compact(fig)
+
+
+def _show(build, *args, state=None):
+    # Renders a figure through the shared cache, building and compacting it only on a miss;
+    # figures of a single state pass it so they are only invalidated by revisions of that state
+    with tr.span(f"render:{build.__name__}"):
+        text = fc.figure_json(build.__name__, lambda *values: _build(build, *values), *args, state=state)
+        pl.show(text, build.__name__, use_container_width=True)
+
+
+def marker_sizes(frame, column):
+    """
+    Returns the frame and the column to size its map markers by. Plotly only accepts
+    non-negative sizes, so a metric with negative values (e.g. a derived "Male - Female")
+    is sized by its magnitude, in an added '|column|' column; its color still shows the sign.
+
+    Parameters:
+    - frame (DataFrame): The rows to plot.
+    - column (str): The metric the markers are sized by.
+    """
+    if not (frame[column] < 0).any():
+        return frame, column
+    magnitude = f"|{column}|"
+    return frame.assign(**{magnitude: frame[column].abs()}), magnitude
+
 
 def overall(state, Primary_level, Secondary_level):
     """
@@ -15,26 +53,41 @@ def overall(state, Primary_level, Secondary_level):
     - Primary_level (str): The primary education level (used to set bubble sizes).
     - Secondary_level (str): The secondary education level (used to set bubble color).
     """
-    final_df["State_District"] = final_df["State"] + " --- " + final_df["District"]
+    _show(overall_figure, state, Primary_level, Secondary_level, state=None if state == 'Overall India' else state)
+
+
+def overall_figure(state, Primary_level, Secondary_level):
+    """
+    Builds the figure shown by overall(); arguments are the same.
+    """
+    import plotly.express as px
+
+    columns = ['State', 'State_District', 'Latitude', 'Longitude', Primary_level, Secondary_level]
     if state == 'Overall India':
+        # Large tables are drawn from spatial bins at country zoom
+        metrics = [Primary_level, Secondary_level]
+        final_df, is_binned = lod.level_of_detail(ds.census(columns + lod.inputs(metrics)), metrics, zoom=3)
+        hover_data = {'Latitude': False, 'Longitude': False}
+        if not is_binned:
+            hover_data['State'] = False
         title_text = f"{state} Analysis of {Primary_level} vs {Secondary_level}"
-        fig = px.scatter_mapbox(final_df, lat="Latitude", lon="Longitude", size=Primary_level, color=Secondary_level,
+        final_df, size = marker_sizes(final_df, Primary_level)
+        fig = px.scatter_mapbox(final_df, lat="Latitude", lon="Longitude", size=size, color=Secondary_level,
                                 color_continuous_scale='Viridis', size_max=25, zoom=3, mapbox_style="carto-positron",
-                                width=1200, height=700, hover_name='State_District',
-                                hover_data={'State': False, 'Latitude': False, 'Longitude': False},
-                                title=title_text)
+                                width=1200, height=700, hover_name='Label' if is_binned else 'State_District',
+                                hover_data=hover_data, title=title_text)
         fig.update_layout(title={'x': 0.34})
-        st.plotly_chart(fig, use_container_width=True)
     else:
-        state_detail = final_df[final_df['State'] == state]
+        state_detail = ds.state_slice(state, columns)
         title_text = f"{state} Analysis of {Primary_level} vs {Secondary_level}"
-        fig = px.scatter_mapbox(state_detail, lat="Latitude", lon="Longitude", size=Primary_level, color=Secondary_level,
+        state_detail, size = marker_sizes(state_detail, Primary_level)
+        fig = px.scatter_mapbox(state_detail, lat="Latitude", lon="Longitude", size=size, color=Secondary_level,
                                 color_continuous_scale='Viridis', size_max=20, zoom=3, mapbox_style="carto-positron",
                                 width=1200, height=700, hover_name='State_District',
                                 hover_data={'State': False, 'Latitude': False, 'Longitude': False},
                                 title=title_text)
         fig.update_layout(title={'x': 0.34})
-        st.plotly_chart(fig, use_container_width=True)
+    return fig
 
 
 def district_category(State, category,top_bottom, num_districts):
@@ -47,15 +100,26 @@ def district_category(State, category,top_bottom, num_districts):
     - top_bottom(str): To get district from  top or bottom
     - num_districts(int): To get number of districts
     """
-    top5 = final_df[final_df['State'] == State].sort_values(by=category, ascending=(top_bottom =='Bottom')).head(num_districts)
+    _show(district_category_figure, State, category, top_bottom, num_districts, state=State)
+
+
+def district_category_figure(State, category,top_bottom, num_districts):
+    """
+    Builds the figure shown by district_category(); arguments are the same.
+    """
+    import plotly.express as px
+
+    top5 = rk.top_districts(State, category, top_bottom, num_districts,
+                            ['State', 'District', 'Latitude', 'Longitude', category])
+    top5, size = marker_sizes(top5, category)
     fig = px.scatter_mapbox(
-        top5, lat="Latitude", lon="Longitude", size=category, color=category,
+        top5, lat="Latitude", lon="Longitude", size=size, color=category,
         color_continuous_scale='Viridis', size_max=20, zoom=6, mapbox_style="carto-positron",
         width=1200, height=700, hover_name='District',
         hover_data={'State': True, 'Latitude': False, 'Longitude': False}
     )
     fig.update_layout(title=f"Top 5 Districts in {State} by {category}", title_x=0.34)
-    st.plotly_chart(fig, use_container_width=True)
+    return fig
 
 
 def plot_state_on_map(state_name):
@@ -65,7 +129,16 @@ def plot_state_on_map(state_name):
     Parameters:
     - state_name (str): The name of the state to plot.
     """
-    selected_state_df = final_df[final_df['State'] == state_name]
+    _show(plot_state_on_map_figure, state_name, state=state_name)
+
+
+def plot_state_on_map_figure(state_name):
+    """
+    Builds the figure shown by plot_state_on_map(); arguments are the same.
+    """
+    import plotly.express as px
+
+    selected_state_df = ds.state_slice(state_name, ['State', 'District', 'Latitude', 'Longitude', 'Population'])
     fig = px.scatter_mapbox(
         selected_state_df, lat="Latitude", lon="Longitude", hover_name="District",
         size="Population", zoom=4, size_max=20, mapbox_style="carto-positron",
@@ -76,7 +149,7 @@ def plot_state_on_map(state_name):
                        "lon": selected_state_df.iloc[0]['Longitude']},
         mapbox_zoom=5, title=f"Map of Districts in {state_name}", title_x=0.34
     )
-    st.plotly_chart(fig, use_container_width=True)
+    return fig
 
 
 def state_District_information(state, district, category):
@@ -88,15 +161,25 @@ def state_District_information(state, district, category):
     - district (str): The district within the state.
     - category (str): The category to use for color and bubble size.
     """
-    state_df = final_df[(final_df['State'] == state) & (final_df['District'] == district)]
+    _show(state_District_information_figure, state, district, category, state=state)
+
+
+def state_District_information_figure(state, district, category):
+    """
+    Builds the figure shown by state_District_information(); arguments are the same.
+    """
+    import plotly.express as px
+
+    state_df = ds.district_rows(state, district, ['State', 'District', 'Latitude', 'Longitude', category])
+    state_df, size = marker_sizes(state_df, category)
     fig = px.scatter_mapbox(
         state_df, lat="Latitude", lon="Longitude", color=category,
-        color_continuous_scale='Viridis', size=category, size_max=20, zoom=6,
+        color_continuous_scale='Viridis', size=size, size_max=20, zoom=6,
         mapbox_style="carto-positron", width=1200, height=700, hover_name='District',
         hover_data={'State': True, 'Latitude': False, 'Longitude': False}
     )
     fig.update_layout(title=f"Information for {district} in {state} - {category}", title_x=0.34)
-    st.plotly_chart(fig, use_container_width=True)
+    return fig
 
 
 def plot_literacy_rate(category_col, rate_col, category_name, top_bottom, num_states):
@@ -110,12 +193,16 @@ def plot_literacy_rate(category_col, rate_col, category_name, top_bottom, num_st
     - top_bottom (str): Whether to show "Top" or "Bottom" states.
     - num_states (int): The number of states to display.
     """
-    pop = final_df.groupby('State')['Population'].sum().reset_index()
-    literate = final_df.groupby('State')[category_col].sum().reset_index()
-    merged_data = pop.merge(literate, on='State')
-    merged_data[rate_col] = round((merged_data[category_col] / merged_data['Population']) * 100)
-    merged_data = merged_data.merge(state_df, on='State')
-    sorted_data = merged_data.sort_values(by=rate_col, ascending=(top_bottom == "Bottom")).head(num_states)
+    _show(plot_literacy_rate_figure, category_col, rate_col, category_name, top_bottom, num_states)
+
+
+def plot_literacy_rate_figure(category_col, rate_col, category_name, top_bottom, num_states):
+    """
+    Builds the figure shown by plot_literacy_rate(); arguments are the same.
+    """
+    import plotly.express as px
+
+    sorted_data = literacy_rates(category_col, rate_col, top_bottom, num_states)
     fig = px.scatter_mapbox(
         sorted_data, lat="Latitude", lon="Longitude", color=rate_col,
         color_continuous_scale='Viridis', size=rate_col, size_max=20, zoom=3,
@@ -123,7 +210,24 @@ def plot_literacy_rate(category_col, rate_col, category_name, top_bottom, num_st
         hover_data={'State': True, 'Latitude': False, 'Longitude': False}
     )
     fig.update_layout(title=f"{top_bottom} {num_states} States by {category_name}", title_x=0.34)
-    st.plotly_chart(fig, use_container_width=True)
+    return fig
+
+
+def literacy_rates(category_col, rate_col, top_bottom, num_states):
+    """
+    Returns the top or bottom states by a literacy rate, as mapped by plot_literacy_rate():
+    State, Population, the literate count, the rounded rate and the state centroid.
+
+    Parameters:
+    - category_col (str): The literate count column the rate is computed from.
+    - rate_col (str): Name of the rate column to add.
+    - top_bottom (str): Whether to return the "Top" or "Bottom" states.
+    - num_states (int): The number of states to return.
+    """
+    sorted_data = rk.top_states(category_col, top_bottom, num_states, per='Population', located=True,
+                                columns=['Population', category_col, 'Latitude', 'Longitude'])
+    sorted_data[rate_col] = round((sorted_data[category_col] / sorted_data['Population']) * 100)
+    return sorted_data
 
 
 def plot_population(top_bottom, num_states):
@@ -134,9 +238,17 @@ def plot_population(top_bottom, num_states):
     - top_bottom (str): Whether to show "Top" or "Bottom" states.
     - num_states (int): The number of states to display.
     """
-    pop = final_df.groupby('State')['Population'].sum().reset_index()
-    merged_data = pop.merge(state_df, on='State')
-    sorted_data = merged_data.sort_values(by='Population', ascending=(top_bottom == "Bottom")).head(num_states)
+    _show(plot_population_figure, top_bottom, num_states)
+
+
+def plot_population_figure(top_bottom, num_states):
+    """
+    Builds the figure shown by plot_population(); arguments are the same.
+    """
+    import plotly.express as px
+
+    sorted_data = rk.top_states('Population', top_bottom, num_states, located=True,
+                                columns=['Population', 'Latitude', 'Longitude'])
     fig = px.scatter_mapbox(
         sorted_data, lat="Latitude", lon="Longitude", color='Population',
         color_continuous_scale='Viridis', size='Population', size_max=20, zoom=3,
@@ -144,26 +256,78 @@ def plot_population(top_bottom, num_states):
         hover_data={'State': True, 'Latitude': False, 'Longitude': False}
     )
     fig.update_layout(title=f"{top_bottom} {num_states} States by Population", title_x=0.34)
-    st.plotly_chart(fig, use_container_width=True)
+    return fig
+
+
+def plot_state_metric(metric, top_bottom, num_states):
+    """
+    Displays a map of the top or bottom states by a derived metric, computed from state sums.
+
+    Parameters:
+    - metric (str): The derived metric (see Metrics.py).
+    - top_bottom (str): Whether to show "Top" or "Bottom" states.
+    - num_states (int): The number of states to display.
+    """
+    _show(plot_state_metric_figure, metric, top_bottom, num_states)
+
+
+def plot_state_metric_figure(metric, top_bottom, num_states):
+    """
+    Builds the figure shown by plot_state_metric(); arguments are the same.
+    """
+    import plotly.express as px
+
+    sorted_data = rk.top_states(metric, top_bottom, num_states, located=True,
+                                columns=[metric, 'Latitude', 'Longitude'])
+    sorted_data, size = marker_sizes(sorted_data, metric)
+    fig = px.scatter_mapbox(
+        sorted_data, lat="Latitude", lon="Longitude", color=metric,
+        color_continuous_scale='Viridis', size=size, size_max=20, zoom=3,
+        mapbox_style="carto-positron", width=1200, height=700, hover_name='State',
+        hover_data={'State': True, 'Latitude': False, 'Longitude': False}
+    )
+    fig.update_layout(title=f"{top_bottom} {num_states} States by {metric}", title_x=0.34)
+    return fig
+
+
+# Categories of state_category(): literacy categories map to the arguments of plot_literacy_rate();
+# derived metrics (Metrics.names()) are offered after these
+LITERACY_CATEGORIES = {
+    'Literacy Rate': ('Literate', 'State_literacy', 'Literacy Rate'),
+    'Male Literacy Rate': ('Male_Literate', 'Male_literacy', 'Male Literacy Rate'),
+    'Female Literacy Rate': ('Female_Literate', 'Female_literacy', 'Female Literacy Rate'),
+}
+STATE_CATEGORIES = list(LITERACY_CATEGORIES) + ['Population']
 
 
 def state_category(category, top_bottom, num_states):
     """
-    Directs the display of a literacy rate or population map for the top or bottom states.
+    Directs the display of a literacy rate, population or derived metric map for the top or bottom states.
 
     Parameters:
-    - category (str): The category to analyze (e.g., 'Literacy Rate', 'Population').
+    - category (str): The category to analyze (e.g., 'Literacy Rate', 'Population', a derived metric).
     - top_bottom (str): Whether to show "Top" or "Bottom" states.
     - num_states (int): The number of states to display.
     """
-    if category == 'Literacy Rate':
-        plot_literacy_rate('Literate', 'State_literacy', 'Literacy Rate', top_bottom, num_states)
-    elif category == 'Male Literacy Rate':
-        plot_literacy_rate('Male_Literate', 'Male_literacy', 'Male Literacy Rate', top_bottom, num_states)
-    elif category == 'Female Literacy Rate':
-        plot_literacy_rate('Female_Literate', 'Female_literacy', 'Female Literacy Rate', top_bottom, num_states)
+    if category in LITERACY_CATEGORIES:
+        plot_literacy_rate(*LITERACY_CATEGORIES[category], top_bottom, num_states)
     elif category == 'Population':
         plot_population(top_bottom, num_states)
+    elif dm.is_metric(category):
+        plot_state_metric(category, top_bottom, num_states)
+
+
+def state_category_figure(category, top_bottom, num_states):
+    """
+    Builds the figure shown by state_category(); arguments are the same.
+    """
+    if category in LITERACY_CATEGORIES:
+        return plot_literacy_rate_figure(*LITERACY_CATEGORIES[category], top_bottom, num_states)
+    if category == 'Population':
+        return plot_population_figure(top_bottom, num_states)
+    if dm.is_metric(category):
+        return plot_state_metric_figure(category, top_bottom, num_states)
+    raise ValueError(f"Unknown state category '{category}'; expected one of {STATE_CATEGORIES + dm.names()}")
 
 
 def comparision(district_data, district, category, state):
@@ -176,6 +340,15 @@ def comparision(district_data, district, category, state):
     - category (str): The category to compare across districts.
     - state (str): The state containing the district.
     """
+    _show(comparision_figure, district_data, district, category, state, state=state)
+
+
+def comparision_figure(district_data, district, category, state):
+    """
+    Builds the figure shown by comparision(); arguments are the same.
+    """
+    import plotly.express as px
+
     fig_district = px.scatter(
         district_data, x=category, y=category, color="District",
         labels={category: category}, title=f"{category} Comparison in Districts of {state}",
@@ -187,4 +360,108 @@ def comparision(district_data, district, category, state):
         mode="markers", marker=dict(color="red", size=15, symbol="circle"),
         name=f"{district} (Selected)"
     )
-    st.plotly_chart(fig_district, use_container_width=True)
+    return fig_district
+
+
+def nearby_districts(state, district, category, count=None, radius_km=None):
+    """
+    Displays a map of the districts nearest to a district, across state borders.
+
+    Parameters:
+    - state (str): The state containing the district.
+    - district (str): The district whose neighbours are shown.
+    - category (str): The category to use for color and bubble size.
+    - count (int): Show this many nearest districts.
+    - radius_km (float): Show the districts within this distance instead.
+    """
+    _show(nearby_districts_figure, state, district, category, count, radius_km)
+
+
+def nearby_districts_figure(state, district, category, count=None, radius_km=None):
+    """
+    Builds the figure shown by nearby_districts(); arguments are the same.
+    """
+    import plotly.express as px
+
+    columns = ['State', 'District', 'Latitude', 'Longitude', category]
+    nearby = sp.neighbours(state, district, count, radius_km, columns)
+    selected = ds.district_rows(state, district, columns).iloc[:1]
+    # Zoom out until the farthest neighbour fits
+    farthest = nearby['Distance_km'].max() if len(nearby) else radius_km or 50
+    zoom = float(np.clip(np.log2(20000 / max(farthest, 10)) - 1, 3, 9))
+    nearby, size = marker_sizes(nearby, category)
+    fig = px.scatter_mapbox(
+        nearby, lat="Latitude", lon="Longitude", color=category, size=size,
+        color_continuous_scale='Viridis', size_max=20, zoom=zoom, mapbox_style="carto-positron",
+        width=1200, height=700, hover_name='District',
+        center={'lat': float(selected['Latitude'].iat[0]), 'lon': float(selected['Longitude'].iat[0])},
+        hover_data={'State': True, 'Distance_km': ':.0f', 'Latitude': False, 'Longitude': False}
+    )
+    fig.add_scattermapbox(
+        lat=selected['Latitude'], lon=selected['Longitude'], mode="markers",
+        marker=dict(color="red", size=15), name=f"{district} (Selected)", hovertext=selected['District']
+    )
+    scope = f"{count} Nearest Districts" if radius_km is None else f"Districts within {radius_km:g} km"
+    fig.update_layout(title=f"{scope} of {district} ({state}) - {category}", title_x=0.34)
+    return fig
+
+
+def nearby_comparison(state, district, category, count=None, radius_km=None):
+    """
+    Compares a district to its nearest districts, across state borders, in a specified category.
+
+    Parameters are those of nearby_districts().
+    """
+    _show(nearby_comparison_figure, state, district, category, count, radius_km)
+
+
+def nearby_comparison_figure(state, district, category, count=None, radius_km=None):
+    """
+    Builds the figure shown by nearby_comparison(); arguments are the same.
+    """
+    import plotly.express as px
+
+    columns = ['State', 'District', category]
+    nearby = sp.neighbours(state, district, count, radius_km, columns)
+    selected = ds.district_rows(state, district, columns).iloc[:1].assign(Distance_km=0.0)
+    compared = pd.concat([selected, nearby])
+    compared['Label'] = compared['District'].astype(str) + ' (' + compared['State'].astype(str) + ')'
+    compared['Role'] = ['Selected'] + ['Neighbour'] * len(nearby)
+    fig = px.bar(
+        compared, x='Label', y=category, color='Role', hover_data={'Distance_km': ':.0f', 'Label': False},
+        color_discrete_map={'Selected': 'red', 'Neighbour': '#8fb8de'},
+        labels={'Label': 'District (nearest first)'}, title=f"{category} of {district} and its Neighbours"
+    )
+    return fig
+
+
+def similar_districts(state, district, count, metrics, weights):
+    """
+    Displays the standardized metric profiles of a district and the districts most similar to it.
+
+    Parameters:
+    - state (str): The state containing the district.
+    - district (str): The district to compare.
+    - count (int): The number of similar districts to show.
+    - metrics (list): The metrics to compare on.
+    - weights (list): A weight per metric.
+    """
+    _show(similar_districts_figure, state, district, count, metrics, weights)
+
+
+def similar_districts_figure(state, district, count, metrics, weights):
+    """
+    Builds the figure shown by similar_districts(); arguments are the same.
+    """
+    import plotly.express as px
+
+    similar = si.similar(state, district, count, metrics, weights, ['State', 'District'])
+    selected = ds.district_rows(state, district, ['State', 'District']).iloc[:1]
+    compared = pd.concat([selected, similar])
+    profiles = pd.DataFrame(si.features(metrics)[compared.index.to_numpy()], columns=metrics)
+    profiles['District'] = (compared['District'].astype(str) + ' (' + compared['State'].astype(str) + ')').to_numpy()
+    long = profiles.melt(id_vars='District', var_name='Metric', value_name='Standardized value')
+    fig = px.line(long, x='Metric', y='Standardized value', color='District', markers=True,
+                  title=f"Metric Profiles of {district} and its {count} Most Similar Districts")
+    fig.update_traces(line={'width': 5}, selector={'name': profiles['District'].iat[0]})
+    return fig
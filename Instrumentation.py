@@ -0,0 +1,174 @@
+import functools
+import json
+import os
+import threading
+import time
+
+# CENSUS_TRACE=1 traces every rerun of every session; otherwise only sessions that open the debug panel
+ENABLED = os.environ.get('CENSUS_TRACE', '0') == '1'
+# JSON lines file the finished spans are appended to
+TRACE_FILE = os.environ.get('CENSUS_TRACE_FILE') or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '.census_cache', 'trace.jsonl')
+
+_local = threading.local()
+_write_lock = threading.Lock()
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def _rss_mb():
+    # Resident set size of the process; None where /proc is not available
+    try:
+        with open('/proc/self/statm') as handle:
+            return int(handle.read().split()[1]) * _PAGE_SIZE / 1024 / 1024
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class _NullSpan:
+    # Returned while tracing is off so instrumented code pays only a thread-local lookup
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL = _NullSpan()
+
+
+class _Span:
+
+    def __init__(self, name, spans, stack):
+        self.name = name
+        self._spans = spans
+        self._stack = stack
+
+    def __enter__(self):
+        self._depth = len(self._stack)
+        self._stack.append(self.name)
+        self._rss = _rss_mb()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        elapsed = time.perf_counter() - self._start
+        rss = _rss_mb()
+        if self._stack and self._stack[-1] == self.name:
+            self._stack.pop()
+        self._spans.append({
+            'name': self.name,
+            'start_ms': round((self._start - _local.origin) * 1000, 3),
+            'ms': round(elapsed * 1000, 3),
+            'depth': self._depth,
+            'rss_mb': None if rss is None else round(rss, 1),
+            'rss_delta_mb': None if rss is None or self._rss is None else round(rss - self._rss, 2),
+            'error': None if exc_type is None else exc_type.__name__,
+        })
+        return False
+
+
+def begin(enabled=False, **context):
+    """
+    Starts collecting spans for the current rerun on this thread.
+
+    Parameters:
+    - enabled (bool): Trace this rerun even when CENSUS_TRACE is off (e.g. debug panel open).
+    - context: Fields added to every JSON line of this rerun (session id, view, ...).
+    """
+    if enabled or ENABLED:
+        _local.spans = []
+        _local.stack = []
+        _local.context = dict(context)
+        _local.origin = time.perf_counter()
+    else:
+        _local.spans = None
+
+
+def active():
+    """
+    Tells whether spans are being collected on this thread.
+    """
+    return getattr(_local, 'spans', None) is not None
+
+
+def annotate(**context):
+    """
+    Adds fields to the JSON lines of the current rerun.
+
+    Parameters:
+    - context: Fields to add.
+    """
+    if getattr(_local, 'spans', None) is not None:
+        _local.context.update(context)
+
+
+def span(name):
+    """
+    Returns a context manager timing a named stage and its memory change while tracing is on.
+
+    Parameters:
+    - name (str): The stage name, e.g. 'render:overall_figure'.
+    """
+    spans = getattr(_local, 'spans', None)
+    if spans is None:
+        return _NULL
+    return _Span(name, spans, _local.stack)
+
+
+def start(name):
+    """
+    Opens a span that is closed with stop(), for stages that do not fit a with-block.
+
+    Parameters:
+    - name (str): The stage name.
+    """
+    return span(name).__enter__()
+
+
+def stop(opened):
+    """
+    Closes a span opened with start().
+
+    Parameters:
+    - opened: The value returned by start().
+    """
+    opened.__exit__(None, None, None)
+
+
+def traced(name=None):
+    """
+    Decorates a function so each call is recorded as a span.
+
+    Parameters:
+    - name (str): The span name. The function name when omitted.
+    """
+    def decorate(function):
+        label = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(label):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def end():
+    """
+    Stops collecting spans for the current rerun, appends them to TRACE_FILE as JSON lines
+    and returns them in completion order ('start_ms' gives the start order).
+    """
+    spans = getattr(_local, 'spans', None)
+    _local.spans = None
+    if not spans:
+        return []
+    context = dict(_local.context, ts=round(time.time(), 3))
+    lines = ''.join(json.dumps(dict(context, **entry)) + '\n' for entry in spans)
+    try:
+        os.makedirs(os.path.dirname(TRACE_FILE), exist_ok=True)
+        with _write_lock, open(TRACE_FILE, 'a') as handle:
+            handle.write(lines)
+    except OSError:
+        pass
+    return spans
@@ -0,0 +1,104 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import Metrics as dm
+import StateCube as sc
+
+# Maps with more points than this are drawn from spatial bins instead of one marker per row
+LOD_THRESHOLD = int(os.environ.get('CENSUS_LOD_THRESHOLD', '2000'))
+
+
+def cell_degrees(zoom):
+    """
+    Returns the bin size, in degrees, that keeps bins about eight pixels wide at a map zoom level.
+
+    Parameters:
+    - zoom (float): The mapbox zoom level of the figure.
+    """
+    # A 256 px web-mercator tile spans 360 / 2**zoom degrees of longitude
+    return 8 * 360 / (256 * 2 ** zoom)
+
+
+def inputs(metrics):
+    """
+    Returns the count columns binned() recomputes ratio and derived metrics among `metrics` from.
+
+    Parameters:
+    - metrics (list): Metric or column names.
+    """
+    ratios = [column for name in metrics if name in sc.RATIOS for column in sc.RATIOS[name][:2]]
+    return list(dict.fromkeys(ratios + dm.inputs(metrics)))
+
+
+def binned(frame, metrics, zoom):
+    """
+    Aggregates rows into square latitude/longitude bins sized for the zoom level.
+
+    Count columns are summed per bin. Ratio columns (StateCube.RATIOS) and derived metrics
+    are recomputed from the bin totals of their count columns, i.e. a ratio of sums rather
+    than a mean of district ratios. Other metrics are averaged. Each bin is placed at the
+    mean position of its rows.
+
+    Parameters:
+    - frame (DataFrame): Rows with Latitude, Longitude, the metric columns and the count
+      columns they are recomputed from (inputs()).
+    - metrics (list): The metric columns to aggregate.
+    - zoom (float): The mapbox zoom level of the figure.
+
+    Returns:
+    - DataFrame: One row per non-empty bin with Latitude, Longitude, the metrics,
+      'Districts' (rows in the bin) and 'Label' (hover text).
+    """
+    size = cell_degrees(zoom)
+    latitude = frame['Latitude'].to_numpy(dtype='float64')
+    longitude = frame['Longitude'].to_numpy(dtype='float64')
+    cells = np.floor(latitude / size).astype('int64') * 100_000 + np.floor(longitude / size).astype('int64')
+    _, members = np.unique(cells, return_inverse=True)
+    counts = np.bincount(members)
+
+    result = pd.DataFrame({
+        'Latitude': (np.bincount(members, weights=latitude) / counts).astype('float32'),
+        'Longitude': (np.bincount(members, weights=longitude) / counts).astype('float32'),
+    })
+
+    def totals(column):
+        values = frame[column].to_numpy(dtype='float64')
+        present = ~np.isnan(values)
+        return (np.bincount(members[present], weights=values[present], minlength=len(counts)),
+                np.bincount(members[present], minlength=len(counts)))
+
+    for metric in dict.fromkeys(metrics):
+        if dm.is_metric(metric):
+            result[metric] = dm.evaluate(metric, {column: totals(column)[0] for column in dm.inputs([metric])})
+        elif metric in sc.RATIOS:
+            numerator, denominator, scale = sc.RATIOS[metric]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ratio = totals(numerator)[0] / totals(denominator)[0] * scale
+            result[metric] = np.where(np.isfinite(ratio), ratio, np.nan)
+        elif metric in sc.COUNT_COLUMNS:
+            result[metric] = totals(metric)[0]
+        else:
+            summed, present = totals(metric)
+            result[metric] = summed / present
+    result['Districts'] = counts
+    result['Label'] = pd.Series(counts).astype(str) + ' districts'
+    return result
+
+
+def level_of_detail(frame, metrics, zoom):
+    """
+    Returns the frame itself when it is small enough to draw point by point, otherwise its bins.
+
+    Parameters:
+    - frame (DataFrame): Rows with Latitude, Longitude and the metric columns.
+    - metrics (list): The metric columns to aggregate.
+    - zoom (float): The mapbox zoom level of the figure.
+
+    Returns:
+    - tuple: (DataFrame, bool) where the flag tells whether the rows were binned.
+    """
+    if len(frame) <= LOD_THRESHOLD:
+        return frame, False
+    return binned(frame, metrics, zoom), True
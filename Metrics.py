@@ -0,0 +1,221 @@
+import ast
+import os
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+import DataStore as ds
+import StateCube as sc
+
+# Metrics every process starts with: name -> expression over the count columns
+DEFAULT_METRICS = {
+    'Internet_households_per_1000': 'Households_with_Internet / Population * 1000',
+    'Computer_households_per_1000': 'Households_with_Computer / Population * 1000',
+    'Electrified_households_per_1000': 'Housholds_with_Electric_Lighting / Population * 1000',
+    'Female_share_of_literates': 'Female_Literate / Literate * 100',
+}
+# Longest accepted expression, which also bounds the depth of its syntax tree
+MAX_EXPRESSION = 300
+# Metrics are shared by every session of the process, so the dashboard only lets sessions define
+# them when CENSUS_USER_METRICS=1, and at most MAX_METRICS besides the DEFAULT_METRICS
+USER_METRICS = os.environ.get('CENSUS_USER_METRICS', '0') == '1'
+MAX_METRICS = int(os.environ.get('CENSUS_MAX_METRICS', '16'))
+
+_BINARY = {ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.divide}
+_UNARY = {ast.UAdd: np.positive, ast.USub: np.negative}
+_NAME = re.compile(r'[A-Za-z][A-Za-z0-9_ ]{0,63}')
+# Columns added next to metric values: by the state table (StateCube), binned maps (MapLOD.binned),
+# similar districts (Similarity.similar), nearby districts (Spatial, nearby_comparison_figure)
+_RESERVED = {'State', 'Districts', 'Label', 'Distance', 'Distance_km', 'Role'}
+
+_metrics = {}
+_lock = threading.Lock()
+
+
+class _Metric:
+    """
+    A validated metric: its canonical expression, syntax tree and the count columns it reads.
+    """
+
+    def __init__(self, name, tree):
+        self.name = name
+        self.tree = tree
+        self.expression = ast.unparse(tree)
+        self.inputs = list(dict.fromkeys(node.id for node in ast.walk(tree) if isinstance(node, ast.Name)))
+
+    def evaluate(self, columns):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = np.asarray(_evaluate(self.tree.body, columns), dtype='float64')
+        # Divisions by zero give no value rather than an infinite one
+        return np.where(np.isfinite(values), values, np.nan)
+
+    def district_values(self, dataset):
+        return pd.Series(self.evaluate({name: dataset.column(name).to_numpy() for name in self.inputs}),
+                         name=self.name)
+
+
+def _evaluate(node, columns):
+    if isinstance(node, ast.BinOp):
+        return _BINARY[type(node.op)](_evaluate(node.left, columns), _evaluate(node.right, columns))
+    if isinstance(node, ast.UnaryOp):
+        return _UNARY[type(node.op)](_evaluate(node.operand, columns))
+    if isinstance(node, ast.Constant):
+        return float(node.value)
+    return np.asarray(columns[node.id], dtype='float64')
+
+
+def parse(expression):
+    """
+    Validates a metric expression and returns its syntax tree.
+
+    Expressions combine the count columns of StateCube.COUNT_COLUMNS and numbers with
+    + - * / and parentheses, e.g. "Households_with_Internet / Population * 1000".
+
+    Parameters:
+    - expression (str): The expression to validate.
+
+    Raises:
+    - ValueError: If the expression is malformed, too long or uses anything else.
+    """
+    if len(expression) > MAX_EXPRESSION:
+        raise ValueError(f"Metric expressions are limited to {MAX_EXPRESSION} characters")
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+    except SyntaxError as error:
+        raise ValueError(f"Invalid metric expression: {error.msg}") from None
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            if node.id not in sc.COUNT_COLUMNS:
+                raise ValueError(f"Unknown column '{node.id}'; metrics use the count columns {sc.COUNT_COLUMNS}")
+        elif isinstance(node, ast.Constant):
+            if type(node.value) not in (int, float):
+                raise ValueError(f"Unsupported constant {node.value!r} in metric expression")
+        elif not isinstance(node, (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Load,
+                                   *_BINARY, *_UNARY)):
+            raise ValueError(f"Unsupported syntax '{type(node).__name__}'; use column names, numbers and + - * /")
+    return tree
+
+
+def define(name, expression):
+    """
+    Defines a derived metric for every session of this process. Its district values can be
+    requested like a census column and it can be selected wherever census metrics can.
+    Redefining a metric with the same expression does nothing.
+
+    Parameters:
+    - name (str): The metric name: letters, digits, underscores and spaces, starting with a letter.
+    - expression (str): The expression over the count columns, see parse().
+
+    Raises:
+    - ValueError: If the name is invalid or taken, the expression is invalid, or MAX_METRICS
+      metrics are already defined.
+    """
+    name = name.strip()
+    if not _NAME.fullmatch(name):
+        raise ValueError("Metric names start with a letter and use at most 64 letters, digits, underscores or spaces")
+    if name in ds.CENSUS_SCHEMA.names or name in _RESERVED:
+        raise ValueError(f"'{name}' is already a census column or one the dashboard adds")
+    metric = _Metric(name, parse(expression))
+    with _lock:
+        existing = _metrics.get(name)
+        if existing is not None:
+            if existing.expression != metric.expression:
+                raise ValueError(f"Metric '{name}' is already defined as {existing.expression}")
+            return
+        if len(_metrics) >= len(DEFAULT_METRICS) + MAX_METRICS:
+            raise ValueError(f"At most {MAX_METRICS} metrics can be defined besides the built-in ones")
+        _metrics[name] = metric
+    ds.register_column(name, metric.district_values)
+
+
+def names():
+    """
+    Returns the names of the derived metrics, in definition order.
+    """
+    return list(_metrics)
+
+
+def expression(name):
+    """
+    Returns the canonical expression of a derived metric.
+
+    Parameters:
+    - name (str): The metric name.
+    """
+    return _metrics[name].expression
+
+
+def is_metric(name):
+    """
+    Tells whether a name is a derived metric.
+
+    Parameters:
+    - name (str): The name to check.
+    """
+    return name in _metrics
+
+
+def metric_choices():
+    """
+    Returns the census metrics followed by the derived metrics, for category selectboxes.
+    """
+    return ds.metric_columns() + names()
+
+
+def inputs(metrics):
+    """
+    Returns the count columns the derived metrics among `metrics` are computed from.
+
+    Parameters:
+    - metrics (list): Metric or column names; names that are not derived metrics are skipped.
+    """
+    return list(dict.fromkeys(column for name in metrics if name in _metrics for column in _metrics[name].inputs))
+
+
+def evaluate(name, columns):
+    """
+    Evaluates a derived metric on aggregated counts. As metrics are evaluated on the totals
+    of their count columns, a group's value is a ratio of sums, not a mean of district ratios.
+
+    Parameters:
+    - name (str): The metric name.
+    - columns (dict or DataFrame): Values or arrays of the metric's count columns.
+
+    Returns:
+    - ndarray: The metric values; missing where a denominator is zero.
+    """
+    return _metrics[name].evaluate(columns)
+
+
+def state_values(name, dataset=None):
+    """
+    Returns a derived metric per state, computed once per dataset version from the state sums.
+
+    Parameters:
+    - name (str): The metric name.
+    - dataset: The dataset handed to a DataStore.derived() builder. The current dataset when omitted.
+    """
+    metric = _metrics[name]
+
+    def build(dataset):
+        sums = sc.cube(dataset).sums
+        return pd.Series(metric.evaluate(sums), index=sums.index, name=name)
+    # Keyed on the expression as well, so artifacts persisted by another process are never mistaken
+    key = f"metric:state:{name}:{metric.expression}"
+    return ds.derived(key, build) if dataset is None else dataset.derived(key, build)
+
+
+def national_value(name):
+    """
+    Returns a derived metric for all of India, computed from the national totals.
+
+    Parameters:
+    - name (str): The metric name.
+    """
+    return float(_metrics[name].evaluate(sc.national_totals()))
+
+
+for _name, _expression in DEFAULT_METRICS.items():
+    define(_name, _expression)
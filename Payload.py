@@ -0,0 +1,139 @@
+import json
+import os
+import threading
+
+import numpy as np
+import streamlit as st
+
+import Instrumentation as tr
+
+# Payload optimization of figures sent to the browser; set CENSUS_COMPACT_PAYLOAD=0 to disable
+ENABLED = os.environ.get('CENSUS_COMPACT_PAYLOAD', '1') != '0'
+# Point count above which scatters switch to WebGL and histograms are binned on the server
+WEBGL_THRESHOLD = int(os.environ.get('CENSUS_WEBGL_THRESHOLD', '1000'))
+
+_stats = {}
+_lock = threading.Lock()
+
+
+def _downcast(value):
+    # Numeric arrays travel as base64 typed arrays; halve float64 and shrink integers
+    if isinstance(value, dict):
+        return {key: _downcast(item) for key, item in value.items()}
+    if not isinstance(value, np.ndarray) or value.dtype.kind not in 'fiu':
+        return value
+    if value.dtype.kind == 'f':
+        return value.astype('float32', copy=False)
+    if value.size and value.min() >= np.iinfo('int32').min and value.max() <= np.iinfo('int32').max:
+        return value.astype('int32', copy=False)
+    return value
+
+
+def _prune_hover(spec):
+    # Plotly Express ships hover_data columns hidden with False as customdata anyway
+    template = spec.get('hovertemplate') or ''
+    if 'customdata' in spec and 'customdata' not in template:
+        del spec['customdata']
+
+
+def _point_count(spec):
+    values = spec.get('x')
+    return len(values) if values is not None and hasattr(values, '__len__') else 0
+
+
+def _binned(spec):
+    # Server-side equivalent of a histogram trace: one bar per bin instead of one value per row
+    values = np.asarray(spec['x'], dtype='float64')
+    counts, edges = np.histogram(values[~np.isnan(values)], bins=spec.get('nbinsx') or 20)
+    return {
+        'type': 'bar', 'x': ((edges[:-1] + edges[1:]) / 2).astype('float32'), 'y': counts.astype('int32'),
+        'width': float(edges[1] - edges[0]), 'name': spec.get('name', ''),
+        'marker': spec.get('marker', {}), 'showlegend': spec.get('showlegend', False),
+        'xaxis': spec.get('xaxis', 'x'), 'yaxis': spec.get('yaxis', 'y'),
+    }
+
+
+@tr.traced('compact')
+def compact(fig):
+    """
+    Returns a copy of a figure that is cheaper to send and draw: numeric arrays in reduced
+    precision, no hover fields the hover template does not display, WebGL scatters and
+    pre-binned histograms above WEBGL_THRESHOLD points. Returns the figure unchanged when
+    payload optimization is disabled.
+
+    Parameters:
+    - fig (Figure): The figure to compact.
+    """
+    if not ENABLED:
+        return fig
+    import plotly.graph_objects as go
+
+    traces = []
+    for trace in fig.data:
+        spec = trace.to_plotly_json()
+        _prune_hover(spec)
+        spec = _downcast(spec)
+        if _point_count(spec) > WEBGL_THRESHOLD:
+            if spec['type'] == 'scatter':
+                # Properties that only SVG scatters support (e.g. orientation) are dropped
+                spec.pop('type')
+                spec = go.Scattergl(spec, skip_invalid=True)
+            elif spec['type'] == 'histogram' and 'y' not in spec:
+                spec = _binned(spec)
+        traces.append(spec)
+    return go.Figure(data=traces, layout=fig.layout)
+
+
+def record(name, size):
+    """
+    Records the serialized size of a figure sent to the browser.
+
+    Parameters:
+    - name (str): The figure or renderer name.
+    - size (int): The payload size in bytes.
+    """
+    with _lock:
+        entry = _stats.setdefault(name, {'count': 0, 'bytes': 0, 'last_bytes': 0})
+        entry['count'] += 1
+        entry['bytes'] += size
+        entry['last_bytes'] = size
+
+
+def stats():
+    """
+    Returns the number of figures sent, total bytes and last payload size per figure name.
+    """
+    with _lock:
+        return {name: dict(entry) for name, entry in _stats.items()}
+
+
+def _unvalidated(text):
+    # The JSON comes from a figure that was validated when it was built. st.plotly_chart
+    # validates plain dicts again, property by property, which costs about as much as the rest
+    # of a cache hit; a figure object built without validation is only copied and serialized.
+    # _validate is private to plotly (pinned in requirements.txt): without it the figure is validated
+    import plotly.graph_objects as go
+
+    spec = json.loads(text)
+    try:
+        return go.Figure(spec, _validate=False)
+    except TypeError:
+        return go.Figure(spec)
+
+
+def show(fig, name, **kwargs):
+    """
+    Sends a figure or its serialized JSON to the browser, recording its payload size.
+
+    Parameters:
+    - fig (Figure or str): The figure, or JSON produced from an already compacted figure.
+    - name (str): Name the payload size is recorded under.
+    - kwargs: Passed on to st.plotly_chart.
+    """
+    with tr.span(f"send:{name}"):
+        text = fig if isinstance(fig, str) else compact(fig).to_json()
+        size = len(text.encode())
+        record(name, size)
+        st.plotly_chart(_unvalidated(text), **kwargs)
+    if st.session_state.get('payload_report'):
+        st.caption(f"{name}: {size / 1024:.1f} KB sent")
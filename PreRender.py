@@ -0,0 +1,224 @@
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import os
+import re
+import time
+
+import DataStore as ds
+import GraphFunctions as gf
+import Metrics as dm
+import Payload as pl
+
+# Views that can be pre-rendered: name -> figure builder of GraphFunctions
+RENDERERS = {
+    'district_category': gf.district_category_figure,
+    'state_category': gf.state_category_figure,
+    'plot_state_on_map': gf.plot_state_on_map_figure,
+}
+# Largest N of the app's "Number of Districts" / "Number of States" sliders
+MAX_N = 10
+# Output formats: name -> file extension
+FORMATS = {'json': 'json', 'html': 'html'}
+MANIFEST = 'manifest.json'
+
+# Source files whose changes can change a rendered figure
+_SOURCES = ['GraphFunctions.py', 'Payload.py', 'Ranking.py', 'StateCube.py', 'DataStore.py', 'MapLOD.py', 'Metrics.py']
+
+
+def _code_version():
+    digest = hashlib.sha1()
+    for name in _SOURCES:
+        with open(os.path.join(ds.BASE_DIR, name), 'rb') as handle:
+            digest.update(handle.read())
+    import plotly
+    digest.update(f"{plotly.__version__}:{pl.ENABLED}:{pl.WEBGL_THRESHOLD}".encode())
+    return digest.hexdigest()
+
+
+def _slug(value):
+    return re.sub(r'[^A-Za-z0-9]+', '_', str(value)).strip('_')
+
+
+def combinations(views=None, max_n=MAX_N):
+    """
+    Enumerates the (view, args) combinations the app can show, from the current dataset.
+
+    district_category covers every state x metric x Top/Bottom x N (up to the state's
+    district count, as the app clamps larger N), state_category every category x
+    Top/Bottom x N, and plot_state_on_map every state. Metrics and categories include
+    the derived metrics, as in the app's selectboxes.
+
+    Parameters:
+    - views (list): Only enumerate these views. All of RENDERERS when omitted.
+    - max_n (int): Largest N of the Top/Bottom views.
+    """
+    views = views or list(RENDERERS)
+    if 'district_category' in views:
+        for state in ds.states():
+            largest = min(max_n, len(ds.districts(state)))
+            for category in dm.metric_choices():
+                for top_bottom in ('Top', 'Bottom'):
+                    for count in range(1, largest + 1):
+                        yield 'district_category', (state, category, top_bottom, count)
+    if 'state_category' in views:
+        for category in gf.STATE_CATEGORIES + dm.names():
+            for top_bottom in ('Top', 'Bottom'):
+                for count in range(1, max_n + 1):
+                    yield 'state_category', (category, top_bottom, count)
+    if 'plot_state_on_map' in views:
+        for state in ds.states():
+            yield 'plot_state_on_map', (state,)
+
+
+def _key(view, args):
+    # <view>/<first argument>/<other arguments>, e.g. district_category/Kerala/Population-Top-5
+    if len(args) == 1:
+        return f"{view}/{_slug(args[0])}"
+    return f"{view}/{_slug(args[0])}/" + '-'.join(_slug(value) for value in args[1:])
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f"{path}.{os.getpid()}.tmp"
+    with open(partial, 'wb') as handle:
+        handle.write(data)
+    os.replace(partial, path)
+
+
+def _render(job):
+    """
+    Renders one combination in a worker process and writes the outputs whose content changed.
+
+    Parameters:
+    - job (tuple): (output directory, view, args, fingerprint, {fmt: previous sha256 or None},
+      {derived metric: expression} of the metrics the view uses).
+
+    Returns:
+    - tuple: (view, args, fingerprint, {fmt: manifest output entry}, number of files written).
+    """
+    target, view, args, fingerprint, previous_digests, definitions = job
+    # Spawned workers only start with the default metrics
+    for name, expression in definitions.items():
+        dm.define(name, expression)
+    fig = pl.compact(RENDERERS[view](*args))
+    outputs = {}
+    written = 0
+    for fmt, previous in previous_digests.items():
+        relative = f"{_key(view, args)}.{FORMATS[fmt]}"
+        path = os.path.join(target, relative)
+        if fmt == 'json':
+            data = fig.to_json().encode()
+        else:
+            data = fig.to_html(include_plotlyjs='cdn', full_html=True).encode()
+        digest = hashlib.sha256(data).hexdigest()
+        if digest != previous or not os.path.exists(path):
+            _write(path, data)
+            written += 1
+        outputs[fmt] = {'path': relative, 'sha256': digest, 'bytes': len(data)}
+    return view, args, fingerprint, outputs, written
+
+
+def _load_manifest(path):
+    try:
+        with open(path) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return {}
+
+
+def prerender(target, views=None, formats=('json',), max_n=MAX_N, workers=None, force=False):
+    """
+    Renders every combination of the pre-renderable views to static files under `target`
+    and writes a manifest describing them.
+
+    Combinations whose fingerprint (arguments, dataset or state version, renderer code and
+    payload settings) matches the previous manifest and whose files exist are skipped; files whose
+    re-rendered content is identical are not rewritten. Outputs of combinations that no
+    longer exist are removed.
+
+    Parameters:
+    - target (str): The output directory.
+    - views (list): Only render these views; outputs of other views are kept. All of RENDERERS when omitted.
+    - formats (tuple): Output formats, any of FORMATS.
+    - max_n (int): Largest N of the Top/Bottom views.
+    - workers (int): Worker processes. The number of CPUs when omitted.
+    - force (bool): Render every combination even if its fingerprint is unchanged.
+
+    Returns:
+    - dict: Counts of rendered and skipped combinations, of written and removed files,
+      and the elapsed seconds.
+    """
+    unknown = [fmt for fmt in formats if fmt not in FORMATS]
+    if unknown:
+        raise ValueError(f"Unknown output formats {unknown}; expected any of {list(FORMATS)}")
+    started = time.perf_counter()
+    manifest_path = os.path.join(target, MANIFEST)
+    previous = _load_manifest(manifest_path).get('entries', {})
+    version = ds.dataset_version()
+    code = _code_version()
+
+    # Views left out of this run keep their outputs
+    views = views or list(RENDERERS)
+    entries = {key: entry for key, entry in previous.items() if entry.get('view') not in views}
+    jobs = []
+    for view, args in combinations(views, max_n):
+        key = _key(view, args)
+        # Single-state views only change when a revision touches their state
+        data_version = version if view == 'state_category' else ds.state_version(args[0])
+        definitions = {name: dm.expression(name) for name in args if isinstance(name, str) and dm.is_metric(name)}
+        fingerprint = hashlib.sha1(json.dumps([view, args, data_version, code, sorted(formats),
+                                               definitions]).encode()).hexdigest()
+        old = previous.get(key, {})
+        old_outputs = old.get('outputs', {})
+        if (not force and old.get('fingerprint') == fingerprint
+                and all(os.path.exists(os.path.join(target, f"{key}.{FORMATS[fmt]}")) for fmt in formats)):
+            entries[key] = old
+            continue
+        jobs.append((target, view, args, fingerprint,
+                     {fmt: old_outputs.get(fmt, {}).get('sha256') for fmt in formats}, definitions))
+
+    # Workers forked after this point inherit the loaded data; spawned ones restore the snapshots
+    ds.partition()
+    written = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        for view, args, fingerprint, outputs, count in executor.map(_render, jobs, chunksize=32):
+            entries[_key(view, args)] = {'view': view, 'args': list(args), 'fingerprint': fingerprint,
+                                         'outputs': outputs}
+            written += count
+
+    removed = 0
+    for key, entry in previous.items():
+        for fmt, output in entry.get('outputs', {}).items():
+            if fmt in entries.get(key, {}).get('outputs', {}):
+                continue
+            try:
+                os.remove(os.path.join(target, output['path']))
+                removed += 1
+            except OSError:
+                pass
+
+    skipped = sum(1 for entry in entries.values() if entry.get('view') in views) - len(jobs)
+    result = {'rendered': len(jobs), 'written': written, 'skipped': skipped, 'removed': removed,
+              'seconds': round(time.perf_counter() - started, 2)}
+    os.makedirs(target, exist_ok=True)
+    _write(manifest_path, json.dumps({
+        'dataset_version': version, 'code_version': code, 'formats': sorted(formats),
+        'generated': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()), 'entries': entries,
+    }, indent=1).encode())
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pre-render the common dashboard views to static files.')
+    parser.add_argument('target', nargs='?', default=os.path.join(ds.BASE_DIR, 'prerendered'),
+                        help='output directory (default: prerendered)')
+    parser.add_argument('--views', nargs='+', choices=list(RENDERERS), help='views to render (default: all)')
+    parser.add_argument('--formats', nargs='+', choices=list(FORMATS), default=['json'])
+    parser.add_argument('--max-n', type=int, default=MAX_N, help='largest N of the Top/Bottom views')
+    parser.add_argument('--workers', type=int, help='worker processes (default: number of CPUs)')
+    parser.add_argument('--force', action='store_true', help='render unchanged combinations too')
+    arguments = parser.parse_args()
+    print(prerender(arguments.target, arguments.views, tuple(arguments.formats), arguments.max_n,
+                    arguments.workers, arguments.force))
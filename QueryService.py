@@ -0,0 +1,314 @@
+import argparse
+import asyncio
+import concurrent.futures
+import hashlib
+import json
+import os
+import sys
+import traceback
+import urllib.parse
+
+import DataStore as ds
+import GraphFunctions as gf
+import Instrumentation as tr
+import Metrics as dm
+import Ranking as rk
+from FigureCache import LRUCache
+
+# Threads running the pandas work of queries, so the event loop keeps serving other connections
+WORKERS = int(os.environ.get('CENSUS_API_WORKERS', '4'))
+# Memory budget for serialized query results shared by all clients, in megabytes
+BUDGET_MB = float(os.environ.get('CENSUS_API_CACHE_MB', '32'))
+# Largest accepted request body, number of queries in one batch and N of the Top/Bottom queries
+MAX_BODY = 1024 * 1024
+# Header lines accepted per request; each line is limited to the 64 KiB of the stream reader
+MAX_HEADERS = 100
+MAX_BATCH = 100
+MAX_N = 1000
+# Seconds an idle keep-alive connection is held open
+IDLE_TIMEOUT = 30
+
+_REASONS = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found',
+            405: 'Method Not Allowed', 413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+_cache = LRUCache(int(BUDGET_MB * 1024 * 1024))
+
+
+class QueryError(Exception):
+    """
+    A query that cannot be answered; `status` is the HTTP status it is reported with.
+    """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _records(frame):
+    # to_json writes missing values as null and numpy scalars as plain numbers
+    return json.loads(frame.to_json(orient='records'))
+
+
+def _choice(params, name, choices, default=None):
+    value = params.get(name, default)
+    if value is None:
+        raise QueryError(400, f"Missing parameter '{name}'")
+    if value not in choices:
+        raise QueryError(400, f"Unknown {name} '{value}'")
+    return value
+
+
+def _count(params, default=5):
+    try:
+        value = int(params.get('n', default))
+    except ValueError:
+        raise QueryError(400, "Parameter 'n' must be an integer") from None
+    if not 1 <= value <= MAX_N:
+        raise QueryError(400, f"Parameter 'n' must be between 1 and {MAX_N}")
+    return value
+
+
+def _states(params):
+    return {'states': ds.states()}
+
+
+def _metrics(params):
+    return {'metrics': ds.metric_columns(), 'derived_metrics': {name: dm.expression(name) for name in dm.names()},
+            'literacy_categories': list(gf.LITERACY_CATEGORIES)}
+
+
+def _top_districts(params):
+    state = _choice(params, 'state', ds.states())
+    metric = _choice(params, 'metric', dm.metric_choices(), 'Population')
+    order = _choice(params, 'order', ('Top', 'Bottom'), 'Top')
+    frame = rk.top_districts(state, metric, order, _count(params),
+                             ['District', 'District code', 'Latitude', 'Longitude', metric])
+    return {'state': state, 'metric': metric, 'order': order, 'districts': _records(frame)}
+
+
+def _state_literacy(params):
+    category = _choice(params, 'category', gf.LITERACY_CATEGORIES, 'Literacy Rate')
+    order = _choice(params, 'order', ('Top', 'Bottom'), 'Top')
+    category_col, rate_col, _ = gf.LITERACY_CATEGORIES[category]
+    frame = gf.literacy_rates(category_col, rate_col, order, _count(params))
+    return {'category': category, 'rate_column': rate_col, 'order': order, 'states': _records(frame)}
+
+
+def _district(params):
+    state = _choice(params, 'state', ds.states())
+    district = _choice(params, 'district', ds.districts(state))
+    metric = params.get('metric')
+    columns = None if metric is None else [
+        'State', 'District', 'District code', 'Latitude', 'Longitude', _choice(params, 'metric', dm.metric_choices())]
+    return {'state': state, 'district': district, 'rows': _records(ds.district_rows(state, district, columns))}
+
+
+# Path -> (handler, parameter naming the state the answer depends on, or None for national answers)
+ROUTES = {
+    '/v1/states': (_states, None),
+    '/v1/metrics': (_metrics, None),
+    '/v1/top-districts': (_top_districts, 'state'),
+    '/v1/state-literacy': (_state_literacy, None),
+    '/v1/district': (_district, 'state'),
+}
+
+
+def etag(path, params):
+    """
+    Returns the entity tag of a query's answer without computing it. Answers about one state
+    are tagged with its state_version(), so they stay valid across revisions of other states;
+    the others with dataset_version().
+
+    Parameters:
+    - path (str): The query path, one of ROUTES.
+    - params (dict): The query parameters.
+    """
+    _, scope = ROUTES[path]
+    state = params.get(scope) if scope else None
+    version = ds.state_version(state) if state in ds.partition().states else ds.dataset_version()
+    key = json.dumps([path, sorted(params.items()), version])
+    return '"' + hashlib.sha1(key.encode()).hexdigest()[:24] + '"'
+
+
+def _matches(if_none_match, tag):
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == '*' or tag in [value.strip() for value in if_none_match.split(',')]
+
+
+def query(path, params, if_none_match=None):
+    """
+    Answers one query. Serialized answers are cached per entity tag, and a query whose tag
+    matches `if_none_match` is answered 304 without being computed. Blocking; the server
+    runs it on its worker threads.
+
+    Parameters:
+    - path (str): The query path, one of ROUTES.
+    - params (dict): The query parameters, as strings.
+    - if_none_match (str): The client's If-None-Match header, if any.
+
+    Returns:
+    - tuple: (HTTP status, entity tag or None, JSON body as bytes).
+    """
+    tr.begin(False, service=path)
+    try:
+        with tr.span(f"query:{path}"):
+            if path not in ROUTES:
+                raise QueryError(404, f"Unknown query '{path}'; expected one of {list(ROUTES)}")
+            params = {str(name): str(value) for name, value in params.items()}
+            tag = etag(path, params)
+            if _matches(if_none_match, tag):
+                return 304, tag, b''
+            body = _cache.get(tag)
+            if body is None:
+                body = json.dumps(ROUTES[path][0](params)).encode()
+                _cache.put(tag, body)
+            return 200, tag, body
+    except QueryError as error:
+        return error.status, None, json.dumps({'error': str(error)}).encode()
+    except Exception:
+        traceback.print_exc(file=sys.stderr)
+        return 500, None, json.dumps({'error': 'Internal error'}).encode()
+    finally:
+        tr.end()
+
+
+def stats():
+    """
+    Returns hit, miss and size statistics of the query result cache.
+    """
+    return _cache.stats()
+
+
+class Server:
+    """
+    HTTP/1.1 JSON front end of query(), serving each connection on an asyncio event loop and
+    running queries on a thread pool.
+
+    GET <path>?<params> answers one query of ROUTES and honours If-None-Match.
+    POST /v1/batch answers {"queries": [{"path": ..., "params": {...}, "if_none_match": ...}]}
+    with {"results": [{"path": ..., "status": ..., "etag": ..., "body": ...}]}, in order;
+    the queries of a batch run concurrently.
+    """
+
+    def __init__(self, workers=WORKERS):
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='query')
+
+    async def run(self, path, params, if_none_match=None):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, query, path, params, if_none_match)
+
+    async def _batch(self, body):
+        try:
+            queries = json.loads(body)['queries']
+        except (ValueError, KeyError, TypeError):
+            raise QueryError(400, 'Expected a JSON body {"queries": [...]}') from None
+        if not isinstance(queries, list) or len(queries) > MAX_BATCH:
+            raise QueryError(400, f"'queries' must be a list of at most {MAX_BATCH} queries")
+        if not all(isinstance(item, dict) and isinstance(item.get('params', {}), dict) for item in queries):
+            raise QueryError(400, "Each query must be an object with a 'path' and a 'params' object")
+        results = await asyncio.gather(*(
+            self.run(str(item.get('path')), item.get('params', {}), item.get('if_none_match')) for item in queries))
+        # Answers are spliced in as already serialized JSON
+        parts = []
+        for item, (status, tag, answer) in zip(queries, results):
+            head = json.dumps({'path': item.get('path'), 'status': status, 'etag': tag})[:-1]
+            parts.append(f"{head}, \"body\": ".encode() + (answer or b'null') + b'}')
+        return b'{"results": [' + b', '.join(parts) + b']}'
+
+    async def dispatch(self, method, target, headers, body):
+        """
+        Answers one HTTP request.
+
+        Returns:
+        - tuple: (HTTP status, extra response headers, body as bytes).
+        """
+        url = urllib.parse.urlsplit(target)
+        path = url.path.rstrip('/')
+        try:
+            if path == '/v1/batch':
+                if method != 'POST':
+                    raise QueryError(405, 'Use POST for /v1/batch')
+                return 200, {}, await self._batch(body)
+            if method != 'GET':
+                raise QueryError(405, 'Use GET for queries')
+        except QueryError as error:
+            return error.status, {}, json.dumps({'error': str(error)}).encode()
+        params = {name: values[-1] for name, values in urllib.parse.parse_qs(url.query).items()}
+        status, tag, answer = await self.run(path, params, headers.get('if-none-match'))
+        return status, ({'ETag': tag, 'Cache-Control': 'no-cache'} if tag else {}), answer
+
+    async def handle(self, reader, writer):
+        """
+        Serves the requests of one connection until it is closed or idle for IDLE_TIMEOUT seconds.
+        """
+        try:
+            while True:
+                try:
+                    # Lines over the stream reader's limit raise ValueError too
+                    line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT)
+                    if not line.strip():
+                        break
+                    method, target, version = line.decode('latin-1').split()
+                    headers = {}
+                    for count in range(MAX_HEADERS + 1):
+                        header = await reader.readline()
+                        if header in (b'\r\n', b'\n', b''):
+                            break
+                        if count == MAX_HEADERS:
+                            raise ValueError(f"More than {MAX_HEADERS} header lines")
+                        name, _, value = header.decode('latin-1').partition(':')
+                        headers[name.strip().lower()] = value.strip()
+                    length = int(headers.get('content-length', 0))
+                    if length < 0:
+                        raise ValueError(length)
+                except ValueError:
+                    writer.write(_response(400, {}, b'{"error": "Malformed request"}', False))
+                    break
+                if length > MAX_BODY:
+                    writer.write(_response(413, {}, b'{"error": "Request body too large"}', False))
+                    break
+                body = await reader.readexactly(length) if length else b''
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                status, extra, answer = await self.dispatch(method, target, headers, body)
+                writer.write(_response(status, extra, answer, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8000):
+        """
+        Loads the census and serves until cancelled.
+        """
+        ds.partition()
+        server = await asyncio.start_server(self.handle, host, port)
+        bound = ', '.join(f"http://{sock.getsockname()[0]}:{sock.getsockname()[1]}" for sock in server.sockets)
+        print(f"Serving census queries on {bound}", flush=True)
+        async with server:
+            await server.serve_forever()
+
+
+def _response(status, headers, body, keep_alive):
+    lines = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}",
+             f"Content-Length: {len(body)}",
+             f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    if status != 304:
+        lines.append('Content-Type: application/json')
+    lines.extend(f"{name}: {value}" for name, value in headers.items())
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve census queries as JSON over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=WORKERS, help='query worker threads')
+    arguments = parser.parse_args()
+    try:
+        asyncio.run(Server(arguments.workers).serve(arguments.host, arguments.port))
+    except KeyboardInterrupt:
+        pass
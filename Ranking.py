@@ -0,0 +1,173 @@
+import numpy as np
+
+import DataStore as ds
+import Metrics as dm
+import StateCube as sc
+
+
+def _orderings(values, spans):
+    """
+    Sorts values within each (start, stop) span, ascending for 'Bottom' and descending for 'Top'.
+
+    Ties keep row order and missing values always come last, so results are deterministic.
+
+    Parameters:
+    - values (ndarray): The values to rank.
+    - spans (list): (start, stop) row ranges that are ranked independently.
+
+    Returns:
+    - list: One {'Top': ndarray, 'Bottom': ndarray} of span-relative row positions per span.
+    """
+    values = np.asarray(values, dtype='float64')
+    rows = np.arange(len(values))
+    group = np.repeat(np.arange(len(spans)), [stop - start for start, stop in spans])
+    ascending = np.lexsort((rows, values, group))
+    descending = np.lexsort((rows, -values, group))
+    return [{'Top': descending[start:stop] - start, 'Bottom': ascending[start:stop] - start}
+            for start, stop in spans]
+
+
+def _key(metric):
+    # Derived metrics are keyed on their expression, as in Metrics.state_values(), so rankings
+    # persisted by another process are never reused for a metric redefined under the same name
+    return f"{metric}:{dm.expression(metric)}" if dm.is_metric(metric) else metric
+
+
+def _district_ranking(metric):
+    def build(dataset):
+        partition = ds.partition(dataset)
+        values = dataset.column(metric).to_numpy()
+        per_state = _orderings(values, list(partition.states.values()))
+        return {
+            'states': dict(zip(partition.states, per_state)),
+            'national': _orderings(values, [(0, len(values))])[0],
+        }
+    return ds.derived(f"ranking:district:{_key(metric)}", build)
+
+
+def _merged(rows, keys, added):
+    """
+    Inserts rows into an ordering, keeping it sorted by key and then by row with missing keys last.
+
+    Parameters:
+    - rows (ndarray): Rows sorted by (key, row).
+    - keys (ndarray): The sort key of every row.
+    - added (ndarray): The rows to insert.
+    """
+    added = added[np.lexsort((added, keys[added]))]
+    ordered = keys[rows]
+    positions = np.searchsorted(ordered, keys[added], 'left')
+    tied = np.flatnonzero(np.searchsorted(ordered, keys[added], 'right') > positions)
+    if len(tied):
+        # Rows with an equal key are in row order: search (run of equal keys, row) encoded as one integer
+        same = (ordered[1:] == ordered[:-1]) | (np.isnan(ordered[1:]) & np.isnan(ordered[:-1]))
+        runs = np.concatenate(([0], np.cumsum(~same)))
+        encoded = runs * len(keys) + rows
+        positions[tied] = np.searchsorted(encoded, runs[positions[tied]] * len(keys) + added[tied])
+    return np.insert(rows, positions, added)
+
+
+def _update_district_ranking(name, ranking, dataset, change):
+    # Orderings are relative to each state's rows, so only the changed states are sorted again.
+    # The national ordering keeps the other rows at their new position and merges the changed ones in
+    metric = name[len('ranking:district:'):].split(':', 1)[0]
+    if name != f"ranking:district:{_key(metric)}" or metric not in ds.metric_columns() + dm.names():
+        # Restored for a metric this process defines differently or not at all
+        return None
+    values = np.asarray(dataset.column(metric).to_numpy(), dtype='float64')
+    states = {}
+    moved = np.full(max((stop for _, stop in change.before.values()), default=0), -1, dtype='int64')
+    added = []
+    for state, (start, stop) in change.after.items():
+        if state in change.states:
+            states[state] = _orderings(values[start:stop], [(0, stop - start)])[0]
+            added.append(np.arange(start, stop))
+        else:
+            states[state] = ranking['states'][state]
+            before = change.before[state][0]
+            moved[before:before + stop - start] = np.arange(start, stop)
+    added = np.concatenate(added or [[]]).astype('int64')
+    national = {}
+    for order, keys in (('Top', -values), ('Bottom', values)):
+        rows = moved[ranking['national'][order]]
+        national[order] = _merged(rows[rows >= 0], keys, added)
+    return {'states': states, 'national': national}
+
+
+ds.register_updater('ranking:district:', _update_district_ranking)
+
+
+def _state_values(dataset, stat):
+    cube = sc.cube(dataset)
+    return cube.table if stat == 'sum' else cube.means
+
+
+def _state_ranking(metric, per, stat, located):
+    def build(dataset):
+        table = _state_values(dataset, stat)
+        if dm.is_metric(metric):
+            # Derived metrics of a state are ratios of its sums, whatever the statistic
+            table = table.assign(**{metric: dm.state_values(metric, dataset)})
+        values = table[metric] / table[per] if per else table[metric]
+        ordering = _orderings(values.to_numpy(), [(0, len(values))])[0]
+        if located:
+            # States missing from the centroid table cannot be placed on a map
+            keep = sc.cube(dataset).table['Latitude'].notna().to_numpy()
+            ordering = {side: rows[keep[rows]] for side, rows in ordering.items()}
+        ordering['table'] = table
+        return ordering
+    return ds.derived(f"ranking:state:{stat}:{_key(metric)}:{per}:{located}", build)
+
+
+def top_districts(state, metric, top_bottom, num_districts, columns=None):
+    """
+    Returns the top or bottom districts of a state by a metric.
+
+    Parameters:
+    - state (str): The state to rank districts in.
+    - metric (str): The census column to rank by.
+    - top_bottom (str): "Top" for the highest values, "Bottom" for the lowest.
+    - num_districts (int): The number of districts to return.
+    - columns (list): The columns to return. All columns when omitted.
+    """
+    ordering = _district_ranking(metric)['states'].get(state)
+    rows = ds.state_slice(state, columns)
+    if ordering is None:
+        return rows
+    return rows.iloc[ordering[top_bottom][:num_districts]]
+
+
+def top_national_districts(metric, top_bottom, num_districts, columns=None):
+    """
+    Returns the top or bottom districts of India by a metric.
+
+    Parameters:
+    - metric (str): The census column to rank by.
+    - top_bottom (str): "Top" for the highest values, "Bottom" for the lowest.
+    - num_districts (int): The number of districts to return.
+    - columns (list): The columns to return. All columns when omitted.
+    """
+    ordering = _district_ranking(metric)['national'][top_bottom]
+    return ds.census(columns).iloc[ordering[:num_districts]]
+
+
+def top_states(metric, top_bottom, num_states, per=None, stat='sum', located=False, columns=None):
+    """
+    Returns the top or bottom states by an aggregated metric.
+
+    Parameters:
+    - metric (str): The census column or derived metric to rank by.
+    - top_bottom (str): "Top" for the highest values, "Bottom" for the lowest.
+    - num_states (int): The number of states to return.
+    - per (str): Rank by the ratio of the metric to this column instead (e.g. 'Population').
+    - stat (str): 'sum' to aggregate count columns, 'mean' to average any metric.
+    - located (bool): Only rank states that have centroid coordinates.
+    - columns (list): Columns of the state table to return. The metric and `per` when omitted.
+
+    Returns:
+    - DataFrame: State followed by the requested columns.
+    """
+    ranking = _state_ranking(metric, per, stat, located)
+    if columns is None:
+        columns = [metric, per] if per else [metric]
+    return ranking['table'][columns].iloc[ranking[top_bottom][:num_states]].reset_index()
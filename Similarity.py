@@ -0,0 +1,81 @@
+import numpy as np
+
+import DataStore as ds
+import Metrics as dm
+import StateCube as sc
+
+# Metrics districts are compared on unless others are selected: size, literacy, sex ratio and amenities
+DEFAULT_FEATURES = [
+    'Population', 'literacy_rate', 'sex_ratio', 'Electrified_households_per_1000',
+    'Internet_households_per_1000', 'Computer_households_per_1000',
+]
+
+
+def _standardized(metric):
+    # One metric as z-scores over all districts; counts span orders of magnitude, so they are
+    # compared on a log scale. Missing values sit at the mean, so they neither attract nor repel
+    def build(dataset):
+        values = dataset.column(metric).to_numpy(dtype='float64', na_value=np.nan)
+        if metric in sc.COUNT_COLUMNS:
+            values = np.log1p(np.clip(values, 0, None))
+        spread = np.nanstd(values)
+        standardized = (values - np.nanmean(values)) / (spread if spread > 0 else 1)
+        return np.nan_to_num(standardized, nan=0.0).astype('float32')
+    # Derived metrics are keyed on their expression, as in Metrics.state_values()
+    key = f"similarity:{metric}:{dm.expression(metric)}" if dm.is_metric(metric) else f"similarity:{metric}"
+    return ds.derived(key, build)
+
+
+def features(metrics):
+    """
+    Returns the standardized feature matrix of every district over some metrics. Each column is
+    computed once per dataset version; counts are log-scaled first.
+
+    Parameters:
+    - metrics (list): Census columns or derived metrics.
+
+    Returns:
+    - ndarray: float32 array of shape (rows, metrics).
+    """
+    return np.column_stack([_standardized(metric) for metric in metrics])
+
+
+def similar(state, district, k=5, metrics=None, weights=None, columns=None):
+    """
+    Returns the districts of India most similar to a district, most similar first.
+
+    Similarity is the weighted Euclidean distance between standardized metric vectors,
+    in standard deviations ('Distance'). The district's own rows are left out.
+
+    Parameters:
+    - state (str): The state containing the district.
+    - district (str): The district to compare.
+    - k (int): The number of districts to return.
+    - metrics (list): The metrics to compare on. DEFAULT_FEATURES when omitted.
+    - weights (list): A non-negative weight per metric. Equal weights when omitted.
+    - columns (list): The columns to return. All columns when omitted.
+    """
+    metrics = list(dict.fromkeys(metrics or DEFAULT_FEATURES))
+    weights = np.ones(len(metrics)) if weights is None else np.asarray(weights, dtype='float64')
+    if len(weights) != len(metrics) or (weights < 0).any() or not weights.sum() > 0:
+        raise ValueError("Expected one non-negative weight per metric, not all zero")
+    partition = ds.partition()
+    first, _ = partition.states.get(state, (0, 0))
+    start, stop = partition.districts.get(state, {}).get(district, (0, 0))
+    if stop <= start:
+        raise ValueError(f"Unknown district '{district}' of '{state}'")
+
+    matrix = features(metrics)
+    difference = matrix - matrix[first + start]
+    distances = np.sqrt((difference * difference) @ (weights / weights.sum()))
+    distances[first + start:first + stop] = np.inf
+    k = min(k, len(distances) - (stop - start))
+    if k <= 0:
+        rows = np.empty(0, dtype='int64')
+    else:
+        # Only the k closest rows are sorted
+        closest = np.argpartition(distances, k - 1)[:k]
+        rows = closest[np.lexsort((closest, distances[closest]))]
+    result = ds.census(columns).iloc[rows].copy()
+    result['Distance'] = distances[rows]
+    return result
@@ -0,0 +1,242 @@
+import math
+
+import numpy as np
+
+import DataStore as ds
+
+# Mean Earth radius, in kilometres
+EARTH_RADIUS_KM = 6371.0088
+# Average number of points per grid cell the cell size is chosen for
+POINTS_PER_CELL = 4
+# Upper bound on the number of grid cells, whatever the extent of the points
+MAX_CELLS = 1 << 22
+
+_KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+# Distance beyond which every point on the globe is within range
+_HALF_CIRCUMFERENCE_KM = math.pi * EARTH_RADIUS_KM
+
+
+def haversine_km(latitude, longitude, latitudes, longitudes):
+    """
+    Returns great-circle distances in kilometres from one point to many.
+
+    Parameters:
+    - latitude, longitude (float): The origin, in degrees.
+    - latitudes, longitudes (ndarray): The destinations, in degrees.
+    """
+    lat1, lat2 = np.radians(latitude), np.radians(latitudes)
+    half_dlat = (lat2 - lat1) / 2
+    half_dlon = np.radians(np.asarray(longitudes) - longitude) / 2
+    a = np.sin(half_dlat) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(half_dlon) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def _ranges(starts, stops):
+    # Concatenation of arange(start, stop) for each pair, without a Python loop
+    lengths = stops - starts
+    total = int(lengths.sum())
+    if not total:
+        return np.empty(0, dtype='int64')
+    shifts = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+    return shifts + np.arange(total)
+
+
+class _GridIndex:
+    """
+    Points bucketed into a regular latitude/longitude grid sized for POINTS_PER_CELL points
+    per cell. Points are stored sorted by cell, row by row, so the cells of one grid row that a
+    query overlaps form a single slice. Rows without coordinates are left out. Longitudes do
+    not wrap around the antimeridian, which no census region crosses.
+    """
+
+    def __init__(self, latitudes, longitudes):
+        latitudes = np.asarray(latitudes, dtype='float64')
+        longitudes = np.asarray(longitudes, dtype='float64')
+        located = np.flatnonzero(~(np.isnan(latitudes) | np.isnan(longitudes)))
+        latitudes, longitudes = latitudes[located], longitudes[located]
+        self.size = len(located)
+        self.origin = (latitudes.min(), longitudes.min()) if self.size else (0.0, 0.0)
+        span_lat = max(latitudes.max() - self.origin[0], 1e-6) if self.size else 1e-6
+        span_lon = max(longitudes.max() - self.origin[1], 1e-6) if self.size else 1e-6
+        area = span_lat * span_lon
+        self.cell = math.sqrt(area * max(POINTS_PER_CELL / max(self.size, 1), 1 / MAX_CELLS))
+        self.rows = int(span_lat // self.cell) + 1
+        self.cols = int(span_lon // self.cell) + 1
+
+        cells = self._cell_rows(latitudes) * self.cols + self._cell_cols(longitudes)
+        order = np.argsort(cells, kind='stable')
+        # Table row positions and coordinates, sorted by cell
+        self.points = located[order]
+        self.latitudes = latitudes[order]
+        self.longitudes = longitudes[order]
+        self.offsets = np.searchsorted(cells[order], np.arange(self.rows * self.cols + 1))
+
+    def _cell_rows(self, latitudes):
+        return np.clip(np.floor((latitudes - self.origin[0]) / self.cell), 0, self.rows - 1).astype('int64')
+
+    def _cell_cols(self, longitudes):
+        return np.clip(np.floor((longitudes - self.origin[1]) / self.cell), 0, self.cols - 1).astype('int64')
+
+    def _candidates(self, latitude, longitude, radius_km):
+        # Positions (into the sorted arrays) of the points in the cells overlapping the radius
+        dlat = radius_km / _KM_PER_DEGREE
+        low, high = latitude - dlat, latitude + dlat
+        if high < self.origin[0] or low > self.origin[0] + self.rows * self.cell:
+            return np.empty(0, dtype='int64')
+        # A degree of longitude shrinks with the cosine of the latitude; use the band's widest row
+        widest = max(abs(low), abs(high))
+        dlon = 360.0 if widest >= 89.9 else min(dlat / math.cos(math.radians(widest)), 360.0)
+        first_row, last_row = self._cell_rows(np.array([low, high]))
+        first_col, last_col = self._cell_cols(np.array([longitude - dlon, longitude + dlon]))
+        if longitude + dlon < self.origin[1] or longitude - dlon > self.origin[1] + self.cols * self.cell:
+            return np.empty(0, dtype='int64')
+        rows = np.arange(first_row, last_row + 1) * self.cols
+        return _ranges(self.offsets[rows + first_col], self.offsets[rows + last_col + 1])
+
+    def within(self, latitude, longitude, radius_km):
+        """
+        Returns the table rows within `radius_km` of a point and their distances, nearest first.
+        """
+        if not (math.isfinite(latitude) and math.isfinite(longitude)):
+            return np.empty(0, dtype='int64'), np.empty(0)
+        candidates = self._candidates(latitude, longitude, radius_km)
+        distances = haversine_km(latitude, longitude, self.latitudes[candidates], self.longitudes[candidates])
+        keep = distances <= radius_km
+        rows, distances = self.points[candidates[keep]], distances[keep]
+        order = np.lexsort((rows, distances))
+        return rows[order], distances[order]
+
+    def nearest(self, latitude, longitude, k):
+        """
+        Returns the k table rows nearest to a point and their distances, nearest first.
+        """
+        k = min(k, self.size)
+        if k <= 0:
+            return np.empty(0, dtype='int64'), np.empty(0)
+        # Start from the radius expected to hold k points and double it until it does; every
+        # point within the final radius has been compared, so the k nearest are exact
+        radius = self.cell * _KM_PER_DEGREE * math.sqrt(k / POINTS_PER_CELL)
+        while True:
+            rows, distances = self.within(latitude, longitude, radius)
+            if len(rows) >= k or radius >= _HALF_CIRCUMFERENCE_KM:
+                return rows[:k], distances[:k]
+            radius *= 2
+
+
+def _build(dataset):
+    return _GridIndex(dataset.column('Latitude').to_numpy(), dataset.column('Longitude').to_numpy())
+
+
+def index(dataset=None):
+    """
+    Returns the grid index of district coordinates, built once per dataset version.
+
+    Parameters:
+    - dataset: The dataset handed to a DataStore.derived() builder. The current dataset when omitted.
+    """
+    if dataset is None:
+        return ds.derived('spatial_index', _build)
+    return dataset.derived('spatial_index', _build)
+
+
+def _rows(rows, distances, columns):
+    frame = ds.census(columns).iloc[rows].copy()
+    frame['Distance_km'] = distances
+    return frame
+
+
+def within(latitude, longitude, radius_km, columns=None):
+    """
+    Returns the census rows within a distance of a point, nearest first, with 'Distance_km'.
+
+    Parameters:
+    - latitude, longitude (float): The point, in degrees.
+    - radius_km (float): The distance, in kilometres.
+    - columns (list): The columns to return. All columns when omitted.
+    """
+    return _rows(*index().within(latitude, longitude, radius_km), columns)
+
+
+def nearest(latitude, longitude, k, columns=None):
+    """
+    Returns the k census rows nearest to a point, nearest first, with 'Distance_km'.
+
+    Parameters:
+    - latitude, longitude (float): The point, in degrees.
+    - k (int): The number of rows to return.
+    - columns (list): The columns to return. All columns when omitted.
+    """
+    return _rows(*index().nearest(latitude, longitude, k), columns)
+
+
+def nearest_batch(latitudes, longitudes, k):
+    """
+    Answers a k-nearest query for each of many points.
+
+    Parameters:
+    - latitudes, longitudes (array-like): The query points, in degrees.
+    - k (int): The number of rows per point.
+
+    Returns:
+    - tuple: (rows, distances), arrays of shape (points, k) of table row positions and
+      kilometres, nearest first; padded with -1 and NaN when fewer rows exist.
+    """
+    grid = index()
+    latitudes = np.asarray(latitudes, dtype='float64')
+    longitudes = np.asarray(longitudes, dtype='float64')
+    rows = np.full((len(latitudes), k), -1, dtype='int64')
+    distances = np.full((len(latitudes), k), np.nan)
+    for position, (latitude, longitude) in enumerate(zip(latitudes, longitudes)):
+        found, kilometres = grid.nearest(latitude, longitude, k)
+        rows[position, :len(found)] = found
+        distances[position, :len(found)] = kilometres
+    return rows, distances
+
+
+def within_batch(latitudes, longitudes, radius_km):
+    """
+    Answers a radius query for each of many points.
+
+    Parameters:
+    - latitudes, longitudes (array-like): The query points, in degrees.
+    - radius_km (float or array-like): The distance, in kilometres, for all points or per point.
+
+    Returns:
+    - list: One (rows, distances) pair of arrays per point, nearest first.
+    """
+    grid = index()
+    radii = np.broadcast_to(np.asarray(radius_km, dtype='float64'), np.shape(latitudes))
+    return [grid.within(latitude, longitude, radius)
+            for latitude, longitude, radius in zip(np.asarray(latitudes, dtype='float64'),
+                                                   np.asarray(longitudes, dtype='float64'), radii)]
+
+
+def neighbours(state, district, count=None, radius_km=None, columns=None):
+    """
+    Returns the districts nearest to a district, across state borders, nearest first with
+    'Distance_km'. The district's own rows are left out.
+
+    Parameters:
+    - state (str): The state containing the district.
+    - district (str): The district.
+    - count (int): Return this many nearest districts.
+    - radius_km (float): Return the districts within this distance instead.
+    - columns (list): The columns to return. All columns when omitted.
+    """
+    partition = ds.partition()
+    first, _ = partition.states.get(state, (0, 0))
+    start, stop = partition.districts.get(state, {}).get(district, (0, 0))
+    own = np.arange(first + start, first + stop)
+    if not len(own):
+        return _rows(np.empty(0, dtype='int64'), np.empty(0), columns)
+    origin = ds.census(['Latitude', 'Longitude']).iloc[own[0]]
+    grid = index()
+    if radius_km is not None:
+        rows, distances = grid.within(origin['Latitude'], origin['Longitude'], radius_km)
+    else:
+        rows, distances = grid.nearest(origin['Latitude'], origin['Longitude'], count + len(own))
+    keep = ~np.isin(rows, own)
+    rows, distances = rows[keep], distances[keep]
+    if radius_km is None:
+        rows, distances = rows[:count], distances[:count]
+    return _rows(rows, distances, columns)
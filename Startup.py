@@ -0,0 +1,90 @@
+import argparse
+import importlib
+
+import Instrumentation as tr
+
+# Modules imported while the app starts, in the order app.py needs them
+STARTUP_MODULES = ['streamlit', 'pandas', 'pyarrow', 'DataStore', 'StateCube', 'Metrics', 'Ranking', 'GraphFunctions']
+
+
+def warm_up():
+    """
+    Builds the derived artifacts the app uses (partition index, state cube, every
+    ranking it can ask for, the spatial index and the default similarity features)
+    and persists them, so later process starts load them from disk. Also writes the
+    Arrow snapshots of the CSV files if they are missing, and compacts the logged
+    revisions into a new snapshot.
+
+    Returns:
+    - str: Path of the persisted artifacts.
+    """
+    import DataStore as ds
+    import Ranking as rk
+    import Similarity as si
+    import Spatial as sp
+    import StateCube as sc
+
+    ds.compact()
+    sc.cube()
+    sc.national_describe()
+    first_state = ds.states()[0]
+    ds.state_version(first_state)
+    for metric in ds.metric_columns():
+        rk.top_districts(first_state, metric, 'Top', 1, ['District'])
+        rk.top_states(metric, 'Top', 1, per='Population', located=True, columns=[metric])
+        rk.top_states(metric, 'Top', 1, columns=[metric])
+        rk.top_states(metric, 'Top', 1, stat='mean', columns=[metric])
+    rk.top_states('Population', 'Top', 1, located=True, columns=['Population'])
+    sp.index()
+    si.features(si.DEFAULT_FEATURES)
+    return ds.persist_derived()
+
+
+def breakdown():
+    """
+    Measures where the start of a fresh process goes: module imports, opening the
+    census, building or restoring the derived artifacts and drawing the first figure.
+    Run it in a new process (as the command line does), or imports are already cached.
+
+    Returns:
+    - list: The timing spans, in completion order.
+    """
+    tr.begin(True, run='startup')
+    for module in STARTUP_MODULES:
+        with tr.span(f"import:{module}"):
+            importlib.import_module(module)
+    import DataStore as ds
+    import GraphFunctions as gf
+    import Ranking as rk
+    import StateCube as sc
+
+    with tr.span('first:states'):
+        state = ds.states()[0]
+    with tr.span('first:state_cube'):
+        sc.cube()
+    with tr.span('first:ranking'):
+        rk.top_districts(state, 'Population', 'Top', 5, ['District'])
+    with tr.span('first:figure'):
+        # Includes the deferred plotly.express import
+        gf.district_category_figure(state, 'Population', 'Top', 5)
+    return tr.end()
+
+
+def _print_spans(spans):
+    print(f"{'stage':<64}{'ms':>10}{'rss MB':>10}")
+    for entry in sorted(spans, key=lambda entry: entry['start_ms']):
+        name = '  ' * entry['depth'] + entry['name']
+        print(f"{name:<64}{entry['ms']:>10.1f}{entry['rss_mb'] or 0:>10.1f}")
+    total = sum(entry['ms'] for entry in spans if entry['depth'] == 0)
+    print(f"{'total':<64}{total:>10.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Prepare or measure the start of a census dashboard process.')
+    parser.add_argument('command', choices=['warm', 'breakdown'],
+                        help='warm: persist snapshots and derived artifacts; breakdown: time a cold start')
+    arguments = parser.parse_args()
+    if arguments.command == 'warm':
+        print(warm_up())
+    else:
+        _print_spans(breakdown())
@@ -0,0 +1,168 @@
+import numpy as np
+import pandas as pd
+
+import DataStore as ds
+
+# Raw count columns: summing them per state is meaningful
+COUNT_COLUMNS = [
+    'Population', 'Male', 'Female', 'Literate', 'Male_Literate', 'Female_Literate',
+    'Housholds_with_Electric_Lighting', 'Households_with_Internet', 'Households_with_Computer',
+]
+
+# Ratio columns of India.csv as (numerator, denominator, scale); recomputed from state sums
+RATIOS = {
+    'sex_ratio': ('Female', 'Male', 100),
+    'literacy_rate': ('Literate', 'Population', 100),
+    'Male_literacy_rate': ('Male_Literate', 'Population', 100),
+    'Female_literacy_rate': ('Female_Literate', 'Population', 100),
+}
+
+# Numeric census columns covered by the descriptive statistics
+DESCRIBED_COLUMNS = ['Latitude', 'Longitude', 'District code'] + COUNT_COLUMNS + list(RATIOS)
+# Statistics of DataFrame.describe(), in its order
+STATISTICS = ['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max']
+
+
+class _Cube:
+    """
+    State-level aggregates of one dataset version, computed in a single grouped pass.
+    """
+
+    def __init__(self, dataset, sums=None, describe=None):
+        if sums is None:
+            sums, describe = _per_state(dataset.frame(['State'] + DESCRIBED_COLUMNS))
+        self.sums = sums
+        self.describe = describe
+        self.means = self.describe.xs('mean', axis=1, level=1)[ds.metric_columns()]
+        self.table = sums.join(_ratios(sums))
+        self.table['Districts'] = self.describe[('Population', 'count')].astype('int64')
+        centroids = ds.centroids().set_index('State')
+        self.table = self.table.join(centroids[['Latitude', 'Longitude']])
+        # National totals and means follow from the per-state ones, so revisions never rescan the table
+        self.national_totals = sums.sum()
+        counts = self.describe.xs('count', axis=1, level=1)[ds.metric_columns()]
+        self.national_means = (self.means * counts).sum() / counts.sum()
+
+    def updated(self, dataset, change):
+        """
+        Returns the cube of a revised dataset. Only the rows of the changed states are read
+        and their statistics recomputed.
+
+        Parameters:
+        - dataset: The revised dataset.
+        - change: The DataStore._Change describing the revision.
+        """
+        changed = [state for state in change.states if state in change.after]
+        rows = np.concatenate([np.arange(*change.after[state]) for state in changed] or [[]]).astype('int64')
+        frame = pd.concat([dataset.column(name).iloc[rows] for name in ['State'] + DESCRIBED_COLUMNS], axis=1)
+        sums, describe = _per_state(frame)
+        order = pd.Index(list(change.after), name='State')
+        return _Cube(dataset,
+                     pd.concat([self.sums.drop(index=list(change.states), errors='ignore'), sums]).reindex(order),
+                     pd.concat([self.describe.drop(index=list(change.states), errors='ignore'), describe]).reindex(order))
+
+
+ds.register_updater('state_cube', lambda name, cube, dataset, change: cube.updated(dataset, change))
+
+
+def _per_state(frame):
+    # Sums and descriptive statistics of each state, indexed by state name
+    grouped = frame.groupby('State', observed=True, sort=False)
+    sums = grouped[COUNT_COLUMNS].sum()
+    describe = _describe(grouped, DESCRIBED_COLUMNS)
+    sums.index = describe.index = pd.Index(sums.index.astype(str), name='State')
+    return sums, describe
+
+
+def _describe(grouped, columns):
+    # Same layout as grouped.describe(), which makes a separate pass per column and dominates
+    # the cube build; one vectorized call per statistic is over 40x faster
+    selected = grouped[columns]
+    quantiles = selected.quantile([0.25, 0.5, 0.75])
+    statistics = {'count': selected.count(), 'mean': selected.mean(), 'std': selected.std(),
+                  'min': selected.min(), 'max': selected.max()}
+    for label, quantile in zip(['25%', '50%', '75%'], [0.25, 0.5, 0.75]):
+        statistics[label] = quantiles.xs(quantile, level=-1)
+    described = pd.concat(statistics, axis=1).swaplevel(axis=1).astype('float64')
+    return described[pd.MultiIndex.from_product([columns, STATISTICS])]
+
+
+def _national_describe(frame):
+    # frame.describe() computed the same way as _describe()
+    quantiles = frame.quantile([0.25, 0.5, 0.75])
+    quantiles.index = ['25%', '50%', '75%']
+    statistics = pd.DataFrame({'count': frame.count(), 'mean': frame.mean(), 'std': frame.std(),
+                               'min': frame.min(), 'max': frame.max()}).T
+    return pd.concat([statistics, quantiles]).loc[STATISTICS].astype('float64')
+
+
+def _ratios(sums):
+    ratios = sums[[]].copy()
+    for name, (numerator, denominator, scale) in RATIOS.items():
+        ratios[name] = sums[numerator] / sums[denominator] * scale
+    return ratios
+
+
+def cube(dataset=None):
+    """
+    Returns the state cube of the census data, building it once per dataset version.
+
+    Parameters:
+    - dataset: The dataset handed to a DataStore.derived() builder. The current dataset when omitted.
+    """
+    if dataset is None:
+        return ds.derived('state_cube', _Cube)
+    return dataset.derived('state_cube', _Cube)
+
+
+def state_table():
+    """
+    Returns one row per state: sums of the count columns, the ratio columns recomputed
+    from those sums, the number of districts ('Districts') and the state centroid
+    ('Latitude', 'Longitude'; empty for states missing from the centroid table).
+    """
+    return cube().table.copy(deep=False)
+
+
+def state_means():
+    """
+    Returns the per-state mean of every census metric, indexed by State.
+    """
+    return cube().means.copy(deep=False)
+
+
+def state_describe(state):
+    """
+    Returns descriptive statistics of a state's districts, one row per numeric column.
+
+    Parameters:
+    - state (str): The state to describe.
+    """
+    described = cube().describe.loc[state].unstack()
+    return described.loc[DESCRIBED_COLUMNS, STATISTICS]
+
+
+def national_describe(columns=None):
+    """
+    Returns descriptive statistics of all districts. Their quantiles take a pass over every
+    row, so they are built on first use rather than with the cube, and rebuilt after revisions.
+
+    Parameters:
+    - columns (list): The columns to describe. All numeric columns when omitted.
+    """
+    described = ds.derived('national_describe', lambda dataset: _national_describe(dataset.frame(DESCRIBED_COLUMNS)))
+    return described.copy(deep=False) if columns is None else described[columns]
+
+
+def national_totals():
+    """
+    Returns the national sum of every count column.
+    """
+    return cube().national_totals.copy(deep=False)
+
+
+def national_means():
+    """
+    Returns the mean of every census metric over all districts.
+    """
+    return cube().national_means.copy(deep=False)
@@ -0,0 +1,70 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+import DataStore as ds
+import StateCube as sc
+
+
+def scale_up(frame, factor, seed=0):
+    """
+    Splits every district of a census table into `factor` synthetic sub-districts.
+
+    Each sub-district gets a random share of its district's counts (so state and national
+    totals are preserved), coordinates jittered around the district and ratio columns
+    recomputed from its counts. Output columns match India.csv.
+
+    Parameters:
+    - frame (DataFrame): The census table to scale, with the India.csv columns.
+    - factor (int): Number of sub-districts per district.
+    - seed (int): Seed of the random generator, for reproducible datasets.
+    """
+    rng = np.random.default_rng(seed)
+    source_columns = [name for name in ds.CENSUS_SCHEMA.names if name != 'State_District']
+    base = frame[source_columns].reset_index(drop=True)
+    rows = np.repeat(np.arange(len(base)), factor)
+    copy = np.tile(np.arange(factor), len(base))
+    scaled = base.iloc[rows].reset_index(drop=True)
+
+    suffix = pd.Series(np.where(copy == 0, '', ' #' + copy.astype(str)))
+    scaled['District'] = scaled['District'].astype(str) + suffix
+    scaled['District code'] = np.arange(1, len(scaled) + 1)
+    jitter = np.where(copy == 0, 0.0, 0.3)
+    scaled['Latitude'] = scaled['Latitude'].astype('float64') + rng.normal(0, 1, len(scaled)) * jitter
+    scaled['Longitude'] = scaled['Longitude'].astype('float64') + rng.normal(0, 1, len(scaled)) * jitter
+
+    # Random shares of each district that sum to one
+    shares = rng.gamma(2.0, size=(len(base), factor))
+    shares = (shares / shares.sum(axis=1, keepdims=True)).ravel()
+    for name in sc.COUNT_COLUMNS:
+        scaled[name] = np.round(scaled[name].to_numpy(dtype='float64') * shares).astype('int64')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for name, (numerator, denominator, scale) in sc.RATIOS.items():
+            scaled[name] = np.round(scaled[numerator] / scaled[denominator] * scale)
+    return scaled
+
+
+def write(factor, target=None, seed=0):
+    """
+    Writes a scaled-up copy of India.csv and returns its path.
+
+    Parameters:
+    - factor (int): Number of sub-districts per district.
+    - target (str): Output CSV path. India_x<factor>.csv next to India.csv when omitted.
+    - seed (int): Seed of the random generator.
+    """
+    target = target or os.path.join(ds.BASE_DIR, f"India_x{factor}.csv")
+    source = pd.read_csv(os.path.join(ds.BASE_DIR, 'India.csv'))
+    scale_up(source, factor, seed).to_csv(target, index=False)
+    return target
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a synthetic census table scaled up from India.csv.')
+    parser.add_argument('factor', type=int, help='sub-districts per district, e.g. 10, 100 or 1000')
+    parser.add_argument('output', nargs='?', help='output CSV path (default: India_x<factor>.csv)')
+    parser.add_argument('--seed', type=int, default=0)
+    arguments = parser.parse_args()
+    print(write(arguments.factor, arguments.output, arguments.seed))
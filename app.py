@@ -1,14 +1,49 @@
+import functools
+import uuid
+
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+import DataStore as ds
+import Exports as ex
+import FigureCache as fc
+import Instrumentation as tr
 import GraphFunctions as gf
+import Metrics as dm
+import Payload as pl
+import Ranking as rk
+import Similarity as si
+import Spatial as sp
+import StateCube as sc
 
 st.set_page_config(layout='wide')
 
-# Load the census data
-df = pd.read_csv('India.csv')
-df["State_District"] = df["State"] + " --- " + df["District"]
+# Timing spans for this rerun, collected when the debug panel is open or CENSUS_TRACE=1
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex[:8]
+tr.begin(st.session_state.get("debug_timings", False), session=st.session_state.session_id)
+
+
+def section(name):
+    # Runs a page section as a fragment, so its widgets rerun only that section. A fragment
+    # rerun skips the rest of the script, so it is traced on its own
+    def decorate(function):
+        @st.fragment
+        @functools.wraps(function)
+        def run(*args):
+            alone = not tr.active()
+            if alone:
+                tr.begin(st.session_state.get("debug_timings", False), session=st.session_state.session_id,
+                         section=name)
+            try:
+                with tr.span(f"section:{name}"):
+                    function(*args)
+            finally:
+                if alone:
+                    tr.end()
+        return run
+    return decorate
+
+
 st.sidebar.title("India Census 2011 Data Analysis")
 analysis_option = st.sidebar.selectbox("Select Analysis Type", [
     "Overall Data Analysis",
@@ -16,61 +51,91 @@ analysis_option = st.sidebar.selectbox("Select Analysis Type", [
     "Number of Districts by State",
     "Category-wise State Comparison",
     "District-Level Analysis",
+    "Nearby Districts",
     "List Information"
 ])
+st.sidebar.toggle("Show figure payload sizes", key="payload_report")
+st.sidebar.toggle("Debug timings", key="debug_timings")
+
+# Derived metrics are offered in every category selectbox. They are shared by all sessions,
+# so sessions may only add them when the deployment opts in with CENSUS_USER_METRICS=1
+with st.sidebar.expander("Derived metrics"):
+    for metric_name in dm.names():
+        st.caption(f"**{metric_name}** = {dm.expression(metric_name)}")
+    if dm.USER_METRICS:
+        with st.form("define_metric", clear_on_submit=True):
+            new_name = st.text_input("Name", placeholder="Internet_per_1000")
+            new_expression = st.text_input("Expression over count columns",
+                                           placeholder="Households_with_Internet / Population * 1000")
+            if st.form_submit_button("Add metric"):
+                try:
+                    dm.define(new_name, new_expression)
+                    st.rerun()
+                except ValueError as error:
+                    st.error(str(error))
+
+tr.annotate(view=analysis_option)
+view_span = tr.start(f"view:{analysis_option}")
 
 # Improve Overall Data Analysis: Add descriptive statistics
 if analysis_option == "Overall Data Analysis":
     st.header("Overall Data Analysis 🔍")
 
-    states = df["State"].unique().tolist()
+    states = ds.states()
     states.insert(0, 'Overall India')
     state = st.selectbox("Select State", states)
 
-    Primary_level = st.selectbox("Select Primary Level", list(df.columns[5:df.shape[1] - 1]))
-    Secondary_level = st.selectbox("Select Secondary Level", list(df.columns[5:df.shape[1] - 1]))
+    @section("overall_map")
+    def overall_map(state):
+        Primary_level = st.selectbox("Select Primary Level", dm.metric_choices())
+        Secondary_level = st.selectbox("Select Secondary Level", dm.metric_choices())
 
-    gf.overall(state, Primary_level, Secondary_level)
+        gf.overall(state, Primary_level, Secondary_level)
+
+    overall_map(state)
 
     # Descriptive statistics for the selected state
     if state != "Overall India":
         st.subheader("📊 Descriptive Statistics for " + state)
-        state_data = df[df["State"] == state]
-        st.write(state_data.describe().transpose().iloc[:,1:])
+        st.write(sc.state_describe(state).iloc[:,1:])
 
 # Top Districts: Add rankings and heatmap visualization
 elif analysis_option == "Districts of the state":
     st.header("Districts of the state ")
 
     # State and category selection in the main interface
-    state = st.selectbox("Select State", df["State"].unique())
-    category = st.selectbox("Select Category", list(df.columns[5:df.shape[1] - 1]))
-    top_bottom = st.selectbox(f"Select Top or Bottom District of {state}", ["Top", "Bottom"])
-    num_districts = st.slider("Number of Districts", 1, 10, 5)  # Slider for number of states
+    state = st.selectbox("Select State", ds.states())
+
+    @section("district_ranking")
+    def district_ranking(state):
+        category = st.selectbox("Select Category", dm.metric_choices())
+        top_bottom = st.selectbox(f"Select Top or Bottom District of {state}", ["Top", "Bottom"])
+        num_districts = st.slider("Number of Districts", 1, 10, 5)  # Slider for number of states
 
-    # Filter data for the selected state
-    state_data = df[df['State'] == state]
-    total_districts = state_data['District'].nunique()
-    if num_districts > total_districts:
-        # Display message if not enough districts are available
-        st.warning(f"There are only {total_districts} districts in {state}. Showing available districts.")
-        num_districts = total_districts  # Adjust to the maximum available
+        # Districts of the selected state
+        total_districts = len(ds.districts(state))
+        if num_districts > total_districts:
+            # Display message if not enough districts are available
+            st.warning(f"There are only {total_districts} districts in {state}. Showing available districts.")
+            num_districts = total_districts  # Adjust to the maximum available
 
-    # Dynamic header reflecting user's selection
-    st.header(f"{top_bottom} {num_districts} Districts in {state} by {category} 📊")
+        # Dynamic header reflecting user's selection
+        st.header(f"{top_bottom} {num_districts} Districts in {state} by {category} 📊")
 
-    # Pass the filtered districts to the function for visualization
-    gf.district_category(state, category,top_bottom, num_districts)
+        # Pass the filtered districts to the function for visualization
+        gf.district_category(state, category,top_bottom, num_districts)
+
+    district_ranking(state)
 
 # Number of Districts by State: Improved bar chart and map
 elif analysis_option == "Number of Districts by State":
     st.header("Number of Districts by State 🗺️")
 
-    state = st.selectbox("Select State", df["State"].unique())
+    state = st.selectbox("Select State", ds.states())
 
     # Show number of districts in the selected state
     gf.plot_state_on_map(state)
-    total_district = len(df[df['State'] == state]['District'].unique())
+    total_district = len(ds.districts(state))
 
     # Display the total number of districts in the selected state
     # st.header(f"District Information for {state}")
@@ -78,7 +143,7 @@ elif analysis_option == "Number of Districts by State":
 
     # Show a table of districts in the selected state
     st.subheader("Districts List")
-    st.dataframe(df[df['State'] == state][['District']].drop_duplicates().reset_index(drop=True))
+    st.dataframe(pd.DataFrame({'District': ds.districts(state)}))
     # Add a bar chart showing number of districts in each state
     # district_counts = df[df['State'] == state]['District'].value_counts().reset_index()
     # district_counts.columns = ["State", "Number of Districts"]
@@ -90,14 +155,17 @@ elif analysis_option == "Number of Districts by State":
 elif analysis_option == "Category-wise State Comparison":
     st.header("Category-wise State Comparison 📊")
 
-    category = st.selectbox("Select Category",
-                            ['Literacy Rate', 'Male Literacy Rate', 'Female Literacy Rate', 'Population'])
-    top_bottom = st.selectbox("Select Top or Bottom States", ["Top", "Bottom"])
+    @section("state_ranking")
+    def state_ranking():
+        category = st.selectbox("Select Category", gf.STATE_CATEGORIES + dm.names())
+        top_bottom = st.selectbox("Select Top or Bottom States", ["Top", "Bottom"])
+
+        num_states = st.slider("Number of States", 1, 10, 5)  # Display a slider to select 1 to 10 states, default to 5
 
-    num_states = st.slider("Number of States", 1, 10, 5)  # Display a slider to select 1 to 10 states, default to 5
+        # Call the function with selected options
+        gf.state_category(category, top_bottom, num_states)
 
-    # Call the function with selected options
-    gf.state_category(category, top_bottom, num_states)
+    state_ranking()
 
 
 
@@ -105,118 +173,208 @@ elif analysis_option == "Category-wise State Comparison":
 elif analysis_option == "District-Level Analysis":
     st.header("District-Level Analysis 📍")
 
-    # Select state, district, and category
-    state = st.selectbox("Select State", df["State"].unique())
-    district = st.selectbox("Select District", df[df["State"] == state]["District"].unique())
-    category = st.selectbox("Select Category", list(df.columns[5:df.shape[1] - 1]))
+    # Select state and district; each section below reruns on its own
+    state = st.selectbox("Select State", ds.states())
+    district = st.selectbox("Select District", ds.districts(state))
+
+    @section("district_information")
+    def district_information(state, district):
+        category = st.selectbox("Select Category", dm.metric_choices())
+
+        # Display selected district information
+        gf.state_District_information(state, district, category)
+
+        # Prepare data for scatter plot
+        st.subheader(f"📉 Comparison of {district} to All Districts in {state} - {category}")
+        district_data = ds.state_slice(state, ['District', category])
+        gf.comparision(district_data,district,category,state)
 
-    # Display selected district information
-    gf.state_District_information(state, district, category)
+    @section("similar_districts")
+    def similar_districts(state, district):
+        # Districts anywhere in India with the closest profile over several metrics
+        st.subheader(f"🔎 Districts Most Similar to {district}")
+        similar_metrics = st.multiselect("Compare on", dm.metric_choices(), default=si.DEFAULT_FEATURES)
+        similar_count = st.slider("Number of Similar Districts", 1, 20, 5)
+        if not similar_metrics:
+            st.info("Select at least one metric to compare on.")
+            return
+        with st.expander("Metric weights"):
+            weights = [st.slider(metric, 0.0, 3.0, 1.0, 0.5, key=f"weight:{metric}") for metric in similar_metrics]
+        if sum(weights) == 0:
+            st.warning("Give at least one metric a weight above zero.")
+            return
+        gf.similar_districts(state, district, similar_count, similar_metrics, weights)
+        similar = si.similar(state, district, similar_count, similar_metrics, weights,
+                             ["State", "District"] + similar_metrics)
+        st.dataframe(similar.round({"Distance": 3}), hide_index=True)
 
-    # Prepare data for scatter plot
-    st.subheader(f"📉 Comparison of {district} to All Districts in {state} - {category}")
-    district_data = df[df["State"] == state]
-    gf.comparision(district_data,district,category,state)
+    district_information(state, district)
+    similar_districts(state, district)
+
+
+
+# Nearby Districts: Neighbours of a district across state borders
+elif analysis_option == "Nearby Districts":
+    st.header("Nearby Districts 🧭")
+
+    state = st.selectbox("Select State", ds.states())
+    district = st.selectbox("Select District", ds.districts(state))
+
+    @section("nearby_districts")
+    def nearby_districts(state, district):
+        category = st.selectbox("Select Category", dm.metric_choices())
+        scope = st.radio("Neighbours", ["Nearest districts", "Within a distance"], horizontal=True)
+        if scope == "Nearest districts":
+            count, radius_km = st.slider("Number of Districts", 1, 20, 5), None
+        else:
+            count, radius_km = None, st.slider("Distance (km)", 10, 500, 100, step=10)
+
+        gf.nearby_districts(state, district, category, count, radius_km)
+
+        st.subheader(f"📏 {district} Compared to its Neighbours - {category}")
+        gf.nearby_comparison(state, district, category, count, radius_km)
+        neighbours = sp.neighbours(state, district, count, radius_km, ["State", "District", category])
+        st.dataframe(neighbours.round({"Distance_km": 1}), hide_index=True)
+
+    nearby_districts(state, district)
 
 
 
 # List Information: Enhanced with better visualizations and analysis
 elif analysis_option == "List Information":
     st.header("📊 List Information")
-
-    # Basic Demographic Information by State
-    st.subheader("🌍 State Demographics Overview")
-    state_demographics = df.groupby("State")[
-        ["Population", "literacy_rate", "Male", "Female", "sex_ratio"]].mean().reset_index()
-    st.dataframe(state_demographics)
-
-    # Add descriptive statistics summary
-    st.subheader("📝 Summary Statistics for Demographic Data")
-    st.write(df[["Population", "literacy_rate", "Male", "Female", "sex_ratio"]].describe())
-
-    # Top and Bottom States by Key Metrics
-    st.subheader("🏆 Top and Bottom States by Literacy Rate")
-    top_lit = df.groupby("State")["literacy_rate"].mean().nlargest(5)
-    bottom_lit = df.groupby("State")["literacy_rate"].mean().nsmallest(5)
-    st.write("Top 5 States by Literacy Rate:", top_lit)
-    st.write("Bottom 5 States by Literacy Rate:", bottom_lit)
-
-    # State with Highest and Lowest Population
-    st.subheader("🌟 State with Highest and Lowest Population")
-    highest_population = df.groupby("State")["Population"].sum().idxmax()
-    lowest_population = df.groupby("State")["Population"].sum().idxmin()
-    st.write(f"State with Highest Population: {highest_population} 🏙️")
-    st.write(f"State with Lowest Population: {lowest_population} 🌄")
-
-    # Population Distribution by Gender (Pie chart)
-    st.subheader("👨‍👩‍👧‍👦 Population Distribution by Gender")
-    gender_population = df.groupby("State")[["Male", "Female"]].sum().reset_index()
-    fig_gender_population = px.pie(gender_population, names="State", values="Male",
-                                   title="Gender Population Distribution")
-    st.plotly_chart(fig_gender_population)
-
-    # Literacy Rate Comparison by Gender (Bar chart)
-    st.subheader("📚 Literacy Rate Comparison by Gender")
-    gender_literacy_rate = df.groupby("State")[["Male_literacy_rate", "Female_literacy_rate"]].mean().reset_index()
-    fig_gender_literacy = px.bar(gender_literacy_rate, x="State", y=["Male_literacy_rate", "Female_literacy_rate"],
-                                 title="Literacy Rate Comparison by Gender", barmode="group")
-    st.plotly_chart(fig_gender_literacy)
-
-    # Household Data Summary (Bar chart)
-    st.subheader("🏠 Household Infrastructure")
-    household_data = df[["Housholds_with_Electric_Lighting", "Households_with_Internet",
-                         "Households_with_Computer"]].mean().reset_index()
-    fig_household_data = px.bar(household_data, x="index", y=0,
-                                labels={"index": "Household Category", "0": "Percentage"},
-                                title="Household Infrastructure")
-    st.plotly_chart(fig_household_data)
-
-    # District-Level Statistics
-    st.subheader("📍 District-Level Statistics")
-    state_district_counts = df["State"].value_counts().reset_index(name="District Count")
-    st.write("Number of Districts per State:", state_district_counts)
-
-    # Top 5 districts by Literacy Rate
-    st.subheader("🏅 Top 5 Districts by Literacy Rate")
-    top_districts = df[["District", "literacy_rate", "Population"]].sort_values(by="literacy_rate",
-                                                                                ascending=False).head(5)
-    st.write("Top 5 Districts by Literacy Rate:", top_districts)
-
-    # Districts with Highest and Lowest Literacy Rate
-    st.subheader("📉 Districts with Highest and Lowest Literacy Rate")
-    highest_lit_district = df[["District", "literacy_rate"]].nlargest(1, "literacy_rate")
-    lowest_lit_district = df[["District", "literacy_rate"]].nsmallest(1, "literacy_rate")
-    st.write("District with Highest Literacy Rate: ", highest_lit_district)
-    st.write("District with Lowest Literacy Rate: ", lowest_lit_district)
-
-    # Sex Ratio Distribution (Histogram)
-    st.subheader("⚖️ Sex Ratio Distribution")
-    fig_sex_ratio = px.histogram(df, x="sex_ratio", nbins=20, title="Sex Ratio Distribution")
-    st.plotly_chart(fig_sex_ratio)
-
-    # Population vs Literacy Rate (Scatter plot)
-    st.subheader("💡 Population vs Literacy Rate")
-    fig_population_literacy = px.scatter(df, x="Population", y="literacy_rate", title="Population vs Literacy Rate")
-    st.plotly_chart(fig_population_literacy)
-
-    # Sex Ratio vs Literacy Rate (Scatter plot)
-    st.subheader("💑 Sex Ratio vs Literacy Rate")
-    scatter_data = df[["sex_ratio", "literacy_rate"]].dropna()
-    fig_scatter = px.scatter(scatter_data, x="sex_ratio", y="literacy_rate", title="Sex Ratio vs Literacy Rate")
-    st.plotly_chart(fig_scatter)
-
-    # Literacy Levels Distribution (Bar chart)
-    st.subheader("📖 Literacy Levels Distribution")
-    literacy_counts = df[["Literate", "Male_Literate", "Female_Literate"]].sum().reset_index(name="Count")
-    fig_literacy_levels = px.bar(literacy_counts, x="index", y="Count",
-                                 labels={"index": "Literacy Level", "Count": "Count"},
-                                 title="Literacy Levels Distribution")
-    st.plotly_chart(fig_literacy_levels)
-
-    # Downloadable Summary Report
-    st.subheader("📥 Downloadable Summary Report")
-    csv = df.to_csv(index=False)
-    st.download_button(label="Download Census Summary as CSV", data=csv, mime="text/csv")
+    # Deferred until a view draws a chart of its own: plotly.express is slow to import
+    import plotly.express as px
+
+    # Each group is a tab; only the open tab is computed and sent, and switching tabs reruns the page
+    states_tab, gender_tab, households_tab, districts_tab, download_tab = st.tabs(
+        ["🌍 States", "👫 Gender and Literacy", "🏠 Households", "📍 Districts", "📥 Download"],
+        key="list_information_tab", on_change="rerun")
+
+    with states_tab:
+        if states_tab.open:
+            # Basic Demographic Information by State
+            st.subheader("🌍 State Demographics Overview")
+            # State totals, with the rates recomputed from them rather than averaged over districts
+            state_demographics = sc.state_table()[["Population", "literacy_rate", "Male", "Female",
+                                                   "sex_ratio"]].reset_index()
+            st.dataframe(state_demographics)
+
+            # Add descriptive statistics summary
+            st.subheader("📝 Summary Statistics for Demographic Data")
+            st.write(sc.national_describe(["Population", "literacy_rate", "Male", "Female", "sex_ratio"]))
+
+            # Top and Bottom States by Key Metrics
+            st.subheader("🏆 Top and Bottom States by Literacy Rate")
+            top_lit = rk.top_states("literacy_rate", "Top", 5).set_index("State")["literacy_rate"]
+            bottom_lit = rk.top_states("literacy_rate", "Bottom", 5).set_index("State")["literacy_rate"]
+            st.write("Top 5 States by Literacy Rate:", top_lit)
+            st.write("Bottom 5 States by Literacy Rate:", bottom_lit)
+
+            # State with Highest and Lowest Population
+            st.subheader("🌟 State with Highest and Lowest Population")
+            highest_population = rk.top_states("Population", "Top", 1)["State"].iat[0]
+            lowest_population = rk.top_states("Population", "Bottom", 1)["State"].iat[0]
+            st.write(f"State with Highest Population: {highest_population} 🏙️")
+            st.write(f"State with Lowest Population: {lowest_population} 🌄")
+
+            # District-Level Statistics
+            st.subheader("📍 District-Level Statistics")
+            state_district_counts = sc.state_table()["Districts"].sort_values(
+                ascending=False, kind="stable").reset_index(name="District Count")
+            st.write("Number of Districts per State:", state_district_counts)
+
+    with gender_tab:
+        if gender_tab.open:
+            # Population Distribution by Gender (Pie chart)
+            st.subheader("👨‍👩‍👧‍👦 Population Distribution by Gender")
+            gender_population = sc.state_table()[["Male", "Female"]].reset_index()
+            fig_gender_population = px.pie(gender_population, names="State", values="Male",
+                                           title="Gender Population Distribution")
+            pl.show(fig_gender_population, "gender_population")
+
+            # Literacy Rate Comparison by Gender (Bar chart)
+            st.subheader("📚 Literacy Rate Comparison by Gender")
+            gender_literacy_rate = sc.state_table()[["Male_literacy_rate", "Female_literacy_rate"]].reset_index()
+            fig_gender_literacy = px.bar(gender_literacy_rate, x="State",
+                                         y=["Male_literacy_rate", "Female_literacy_rate"],
+                                         title="Literacy Rate Comparison by Gender", barmode="group")
+            pl.show(fig_gender_literacy, "gender_literacy")
+
+            # Literacy Levels Distribution (Bar chart)
+            st.subheader("📖 Literacy Levels Distribution")
+            literacy_counts = sc.national_totals()[["Literate", "Male_Literate",
+                                                    "Female_Literate"]].reset_index(name="Count")
+            fig_literacy_levels = px.bar(literacy_counts, x="index", y="Count",
+                                         labels={"index": "Literacy Level", "Count": "Count"},
+                                         title="Literacy Levels Distribution")
+            pl.show(fig_literacy_levels, "literacy_levels")
+
+    with households_tab:
+        if households_tab.open:
+            # Household Data Summary (Bar chart)
+            st.subheader("🏠 Household Infrastructure")
+            household_metrics = ["Electrified_households_per_1000", "Internet_households_per_1000",
+                                 "Computer_households_per_1000"]
+            household_data = pd.DataFrame({"Household Category": household_metrics,
+                                           "Per 1000 people": [dm.national_value(name) for name in household_metrics]})
+            fig_household_data = px.bar(household_data, x="Household Category", y="Per 1000 people",
+                                        title="Household Infrastructure")
+            pl.show(fig_household_data, "household_data")
+
+    with districts_tab:
+        if districts_tab.open:
+            # Top 5 districts by Literacy Rate
+            st.subheader("🏅 Top 5 Districts by Literacy Rate")
+            top_districts = rk.top_national_districts("literacy_rate", "Top", 5,
+                                                      ["District", "literacy_rate", "Population"])
+            st.write("Top 5 Districts by Literacy Rate:", top_districts)
+
+            # Districts with Highest and Lowest Literacy Rate
+            st.subheader("📉 Districts with Highest and Lowest Literacy Rate")
+            highest_lit_district = rk.top_national_districts("literacy_rate", "Top", 1, ["District", "literacy_rate"])
+            lowest_lit_district = rk.top_national_districts("literacy_rate", "Bottom", 1, ["District", "literacy_rate"])
+            st.write("District with Highest Literacy Rate: ", highest_lit_district)
+            st.write("District with Lowest Literacy Rate: ", lowest_lit_district)
+
+            # Sex Ratio Distribution (Histogram)
+            st.subheader("⚖️ Sex Ratio Distribution")
+            fig_sex_ratio = px.histogram(ds.census(["sex_ratio"]), x="sex_ratio", nbins=20,
+                                         title="Sex Ratio Distribution")
+            pl.show(fig_sex_ratio, "sex_ratio_distribution")
+
+            # Population vs Literacy Rate (Scatter plot)
+            st.subheader("💡 Population vs Literacy Rate")
+            fig_population_literacy = px.scatter(ds.census(["Population", "literacy_rate"]), x="Population",
+                                                 y="literacy_rate", title="Population vs Literacy Rate")
+            pl.show(fig_population_literacy, "population_vs_literacy")
+
+            # Sex Ratio vs Literacy Rate (Scatter plot)
+            st.subheader("💑 Sex Ratio vs Literacy Rate")
+            scatter_data = ds.census(["sex_ratio", "literacy_rate"]).dropna()
+            fig_scatter = px.scatter(scatter_data, x="sex_ratio", y="literacy_rate", title="Sex Ratio vs Literacy Rate")
+            pl.show(fig_scatter, "sex_ratio_vs_literacy")
+
+    with download_tab:
+        if download_tab.open:
+            # Downloadable Summary Report
+            st.subheader("📥 Downloadable Summary Report")
+
+            @section("export")
+            def export():
+                export_states = st.multiselect("States to export (all when empty)", ds.states())
+                export_columns = st.multiselect("Metrics to export (all when empty)", dm.metric_choices())
+                export_format = st.selectbox("File format", list(ex.FORMATS),
+                                             format_func=lambda fmt: ex.FORMATS[fmt][0])
+                # The export is only serialized when the button is clicked, and then cached
+                st.download_button(label=f"Download Census Summary as {ex.FORMATS[export_format][0]}",
+                                   data=lambda: ex.export_bytes(export_format, export_states, export_columns or None),
+                                   file_name=ex.file_name(export_format), mime=ex.FORMATS[export_format][2],
+                                   on_click="ignore")
+
+            export()
+
+tr.stop(view_span)
 
 footer = """
     <style>
@@ -238,3 +396,11 @@ footer = """
 """
 st.markdown(footer, unsafe_allow_html=True)
 
+# Debug panel: where the time of this rerun went
+spans = tr.end()
+if st.session_state.get("debug_timings"):
+    with st.sidebar.expander("⏱️ Debug timings", expanded=True):
+        st.dataframe(pd.DataFrame(spans, columns=["name", "start_ms", "ms", "depth", "rss_mb", "rss_delta_mb",
+                                                  "error"]).sort_values("start_ms"), hide_index=True)
+        st.write("Figure cache", fc.stats())
+        st.write("Figure payloads", pl.stats())
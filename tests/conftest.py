@@ -0,0 +1,41 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+# The modules live at the top of the repository rather than in a package
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import DataStore as ds  # noqa: E402
+
+
+@pytest.fixture
+def census_copy(tmp_path, monkeypatch):
+    """
+    Points DataStore at a private copy of India.csv and an empty snapshot directory, so tests
+    can revise the census without touching the repository's data or other tests.
+    """
+    source = tmp_path / 'India.csv'
+    shutil.copy(os.path.join(ROOT, 'India.csv'), source)
+    monkeypatch.setattr(ds, 'CENSUS_PATH', str(source))
+    monkeypatch.setattr(ds, 'CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(ds, '_cache', {})
+    return str(source)
+
+
+@pytest.fixture(params=[1, 20], ids=['India', 'synthetic_x20'])
+def scaled_census(request, tmp_path, monkeypatch):
+    """
+    Points DataStore at India.csv itself and at a table 20 times its size written by Synthetic.py.
+    """
+    import Synthetic
+
+    source = os.path.join(ROOT, 'India.csv')
+    if request.param > 1:
+        source = Synthetic.write(request.param, str(tmp_path / f"India_x{request.param}.csv"))
+    monkeypatch.setattr(ds, 'CENSUS_PATH', source)
+    monkeypatch.setattr(ds, 'CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(ds, '_cache', {})
+    return source
@@ -0,0 +1,40 @@
+import os
+
+import DataStore as ds
+import Metrics as dm
+import Ranking as rk
+import StateCube as sc
+
+
+def test_persisted_artifacts_are_restored(census_copy, monkeypatch):
+    sc.cube()
+    path = ds.persist_derived()
+    monkeypatch.setattr(ds, '_cache', {})
+    dataset = ds._census()
+    assert os.path.exists(path) and 'state_cube' in dataset._derived
+
+
+def test_artifacts_of_other_code_are_not_restored(census_copy, monkeypatch):
+    sc.cube()
+    path = ds.persist_derived()
+    # As if StateCube.py or another module defining the artifacts had changed since they were written
+    monkeypatch.setattr(ds, '_code_version', lambda: 'f' * 40)
+    monkeypatch.setattr(ds, '_cache', {})
+    dataset = ds._census()
+    assert os.path.exists(path) and dataset.restored and dataset._derived == {}
+    assert ds.persist_derived() != path and not os.path.exists(path)
+
+
+def test_rankings_of_derived_metrics_are_keyed_on_their_expression(census_copy):
+    metric = 'Internet_households_per_1000'
+    rk.top_districts('Kerala', metric, 'Top', 3)
+    key = f"ranking:district:{metric}:{dm.expression(metric)}"
+    assert key in ds._census()._derived
+    # A ranking restored from a process where the metric had another expression is never used,
+    # and revisions drop it rather than update it
+    stale = f"ranking:district:{metric}:Households_with_Computer / Population * 1000"
+    ds._census()._derived[stale] = ds._census()._derived[key]
+    row = ds.state_slice('Kerala').iloc[[0]].astype({'State': str, 'District': str})
+    row['Households_with_Internet'] = 0
+    ds.apply_changes(row)
+    assert key in ds._census()._derived and stale not in ds._census()._derived
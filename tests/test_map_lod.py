@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import DataStore as ds
+import MapLOD as lod
+import Metrics as dm
+import StateCube as sc
+
+METRICS = ['Population', 'Households_with_Internet', 'literacy_rate', 'sex_ratio', 'Internet_households_per_1000',
+           'District code']
+
+
+def _frame():
+    columns = ['Latitude', 'Longitude'] + METRICS + lod.inputs(METRICS)
+    return ds.census(list(dict.fromkeys(columns)))
+
+
+@pytest.mark.parametrize('zoom', [3, 4.5, 6])
+def test_binned_matches_a_groupby_over_cells(scaled_census, zoom):
+    frame = _frame()
+    size = lod.cell_degrees(zoom)
+    cells = frame.assign(row=np.floor(frame['Latitude'].astype('float64') / size),
+                         column=np.floor(frame['Longitude'].astype('float64') / size))
+    grouped = cells.astype({name: 'float64' for name in frame.columns}).groupby(['row', 'column'], sort=True)
+    sums = grouped.sum(min_count=0)
+    binned = lod.binned(frame, METRICS, zoom)
+
+    np.testing.assert_array_equal(binned['Districts'], grouped.size())
+    np.testing.assert_allclose(binned['Latitude'], grouped['Latitude'].mean(), rtol=1e-6)
+    np.testing.assert_allclose(binned['Longitude'], grouped['Longitude'].mean(), rtol=1e-6)
+    for metric in ('Population', 'Households_with_Internet'):
+        np.testing.assert_allclose(binned[metric], sums[metric])
+    # Ratios are ratios of the bin sums, not means of the district ratios
+    for metric in ('literacy_rate', 'sex_ratio'):
+        numerator, denominator, scale = sc.RATIOS[metric]
+        np.testing.assert_allclose(binned[metric], sums[numerator] / sums[denominator] * scale, rtol=1e-9)
+    np.testing.assert_allclose(binned['Internet_households_per_1000'],
+                               dm.evaluate('Internet_households_per_1000', sums), rtol=1e-9)
+    np.testing.assert_allclose(binned['District code'], grouped['District code'].mean())
+    assert (binned['Label'] == binned['Districts'].astype(str) + ' districts').all()
+
+
+@pytest.mark.parametrize('zoom', [0, 3, 8])
+def test_binning_preserves_totals(scaled_census, zoom):
+    frame = _frame()
+    binned = lod.binned(frame, METRICS, zoom)
+    assert binned['Districts'].sum() == len(frame)
+    for metric in ('Population', 'Households_with_Internet'):
+        assert binned[metric].sum() == pytest.approx(frame[metric].astype('float64').sum(), rel=1e-12)
+
+
+def test_level_of_detail_bins_only_large_frames(scaled_census, monkeypatch):
+    frame = _frame()
+    monkeypatch.setattr(lod, 'LOD_THRESHOLD', len(frame))
+    assert lod.level_of_detail(frame, METRICS, 5) == (frame, False)
+    monkeypatch.setattr(lod, 'LOD_THRESHOLD', len(frame) - 1)
+    assert lod.level_of_detail(frame, METRICS, 5)[1]
@@ -0,0 +1,64 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+import Metrics as dm
+
+
+@pytest.mark.parametrize('expression', [
+    '__import__("os").system("true")',
+    'Population.real',
+    'abs(Population)',
+    'Population ** 2',
+    'Population // 2',
+    'Population % 7',
+    'True',
+    'Population * False',
+    '"Population"',
+    'Population if Literate else Male',
+    '[Population]',
+    'lambda: Population',
+    'Population > Literate',
+    'Latitude / Population',
+    'Population +',
+    '(' * 200 + 'Population' + ')' * 200,
+    ' + '.join(['Population'] * (dm.MAX_EXPRESSION // 10)),
+])
+def test_parse_rejects_anything_but_arithmetic_on_count_columns(expression):
+    with pytest.raises(ValueError):
+        dm.parse(expression)
+
+
+def test_parse_accepts_arithmetic_on_count_columns():
+    tree = dm.parse(' -(Female_Literate + 1.5) / Literate * 100 ')
+    assert sorted(dm._Metric('Share', tree).inputs) == ['Female_Literate', 'Literate']
+    assert dm.parse('Population / ' + '1 + ' * 70 + '1') is not None
+
+
+def test_metric_values_are_ratios_of_sums_without_infinities():
+    values = dm._Metric('Share', dm.parse('Literate / Population * 100')).evaluate(
+        {'Literate': [50, 1, 0], 'Population': [100, 0, 0]})
+    assert values[0] == 50 and np.isnan(values[1:]).all()
+
+
+@pytest.mark.parametrize('name', ['State', 'Districts', 'Label', 'Distance', 'Distance_km', 'Role', 'Population'])
+def test_define_rejects_names_of_existing_columns(name):
+    with pytest.raises(ValueError, match='already a census column'):
+        dm.define(name, 'Literate / Population')
+    assert not dm.is_metric(name)
+
+
+def test_default_metrics_resolve_without_importing_metrics():
+    # A fresh interpreter that only imports Exports, as a script using DataStore directly would
+    script = (
+        "import sys; sys.path.insert(0, {root!r})\n"
+        "import Exports\n"
+        "assert 'Metrics' not in sys.modules\n"
+        "data = Exports.export_bytes('csv', ['Kerala'], ['Internet_households_per_1000'])\n"
+        "assert data.splitlines()[0].decode().endswith('Internet_households_per_1000'), data[:200]\n"
+    )
+    root = os.path.dirname(os.path.abspath(dm.__file__))
+    subprocess.run([sys.executable, '-c', script.format(root=root)], check=True, timeout=300)
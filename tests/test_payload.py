@@ -0,0 +1,29 @@
+import plotly.graph_objects as go
+import pytest
+
+import GraphFunctions as gf
+import Payload as pl
+
+
+@pytest.fixture
+def figure():
+    return pl.compact(gf.district_category_figure('Kerala', 'Population', 'Top', 5))
+
+
+def test_cached_json_rebuilds_the_same_figure(figure):
+    text = figure.to_json()
+    assert pl._unvalidated(text).to_json() == text
+
+
+def test_cached_json_is_validated_without_the_private_keyword(figure, monkeypatch):
+    # As with a plotly release that no longer accepts _validate
+    def strict(*args, **kwargs):
+        if '_validate' in kwargs:
+            raise TypeError("unexpected keyword argument '_validate'")
+        return figure_class(*args, **kwargs)
+    figure_class = go.Figure
+    monkeypatch.setattr(go, 'Figure', strict)
+    text = figure.to_json()
+    assert pl._unvalidated(text).to_json() == text
+    with pytest.raises(ValueError):
+        pl._unvalidated('{"data": [{"type": "bar", "not_a_property": 1}]}')
@@ -0,0 +1,151 @@
+import asyncio
+import json
+
+import pandas as pd
+import pytest
+
+import DataStore as ds
+import QueryService as qs
+
+
+@pytest.fixture
+def server():
+    server = qs.Server(workers=2)
+    yield server
+    server.executor.shutdown()
+
+
+class _Writer:
+    # Collects what Server.handle() writes to a connection
+
+    def __init__(self):
+        self.data = b''
+        self.closed = False
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def _serve(server, request):
+    # Feeds raw request bytes to one connection and returns the parsed responses
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(request)
+        reader.feed_eof()
+        writer = _Writer()
+        await server.handle(reader, writer)
+        return writer
+    writer = asyncio.run(run())
+    assert writer.closed
+    responses = []
+    data = writer.data
+    while data:
+        head, _, rest = data.partition(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        headers = {name.lower(): value.strip() for name, _, value in (line.partition(':') for line in lines[1:])}
+        length = int(headers['content-length'])
+        responses.append((int(lines[0].split()[1]), headers, rest[:length]))
+        data = rest[length:]
+    return responses
+
+
+def test_query_answers_and_revalidates():
+    status, tag, body = qs.query('/v1/top-districts', {'state': 'Kerala', 'metric': 'Literate', 'n': '3'})
+    assert status == 200 and tag.startswith('"')
+    answer = json.loads(body)
+    assert [row['District'] for row in answer['districts']] == list(
+        ds.state_slice('Kerala', ['District', 'Literate']).sort_values('Literate', ascending=False)['District'][:3])
+    assert qs.query('/v1/top-districts', {'state': 'Kerala', 'metric': 'Literate', 'n': 3}, tag) == (304, tag, b'')
+    assert qs.query('/v1/top-districts', {'state': 'Kerala', 'metric': 'Literate', 'n': '3'}, '*')[0] == 304
+    assert qs.query('/v1/top-districts', {'state': 'Kerala', 'metric': 'Literate', 'n': '4'}, tag)[0] == 200
+
+
+@pytest.mark.parametrize('path, params, status', [
+    ('/v1/nowhere', {}, 404),
+    ('/v1/top-districts', {}, 400),
+    ('/v1/top-districts', {'state': 'Atlantis'}, 400),
+    ('/v1/top-districts', {'state': 'Kerala', 'n': '0'}, 400),
+    ('/v1/top-districts', {'state': 'Kerala', 'n': 'five'}, 400),
+    ('/v1/district', {'state': 'Kerala', 'district': 'Nowhere'}, 400),
+])
+def test_query_errors(path, params, status):
+    answer_status, tag, body = qs.query(path, params)
+    assert (answer_status, tag) == (status, None)
+    assert 'error' in json.loads(body)
+
+
+def test_state_etags_survive_revisions_of_other_states(census_copy):
+    kerala = qs.etag('/v1/district', {'state': 'Kerala', 'district': 'Alappuzha'})
+    goa = qs.etag('/v1/district', {'state': 'Goa', 'district': 'North Goa'})
+    national = qs.etag('/v1/states', {})
+    row = ds.state_slice('Goa').iloc[[0]].astype({'State': str, 'District': str})
+    row['Population'] = 1
+    ds.apply_changes(pd.DataFrame(row))
+    assert qs.etag('/v1/district', {'state': 'Kerala', 'district': 'Alappuzha'}) == kerala
+    assert qs.etag('/v1/district', {'state': 'Goa', 'district': 'North Goa'}) != goa
+    assert qs.etag('/v1/states', {}) != national
+
+
+def test_dispatch_get_and_batch(server):
+    status, headers, body = asyncio.run(server.dispatch('GET', '/v1/states/?unused=1', {}, b''))
+    assert status == 200 and headers['ETag'] and json.loads(body)['states'] == ds.states()
+    tag = headers['ETag']
+    assert asyncio.run(server.dispatch('GET', '/v1/states?unused=1', {'if-none-match': tag}, b''))[0] == 304
+
+    batch = {'queries': [{'path': '/v1/states', 'params': {'unused': '1'}, 'if_none_match': tag},
+                         {'path': '/v1/metrics'},
+                         {'path': '/v1/top-districts', 'params': {'state': 'Atlantis'}}]}
+    status, _, body = asyncio.run(server.dispatch('POST', '/v1/batch', {}, json.dumps(batch).encode()))
+    results = json.loads(body)['results']
+    assert status == 200
+    assert [(result['path'], result['status']) for result in results] == [
+        ('/v1/states', 304), ('/v1/metrics', 200), ('/v1/top-districts', 400)]
+    assert results[0]['body'] is None and 'Population' in results[1]['body']['metrics']
+    assert 'error' in results[2]['body']
+
+
+@pytest.mark.parametrize('method, target, body, status', [
+    ('GET', '/v1/batch', b'', 405),
+    ('POST', '/v1/states', b'', 405),
+    ('POST', '/v1/batch', b'not json', 400),
+    ('POST', '/v1/batch', json.dumps({'queries': [1]}).encode(), 400),
+    ('POST', '/v1/batch', json.dumps({'queries': [{'path': '/v1/states'}] * (qs.MAX_BATCH + 1)}).encode(), 400),
+])
+def test_dispatch_rejects_bad_requests(server, method, target, body, status):
+    assert asyncio.run(server.dispatch(method, target, {}, body))[0] == status
+
+
+def test_handle_keeps_connections_alive(server):
+    responses = _serve(server, b'GET /v1/states HTTP/1.1\r\nHost: x\r\n\r\n'
+                               b'GET /v1/metrics HTTP/1.1\r\nConnection: close\r\n\r\n'
+                               b'GET /v1/states HTTP/1.1\r\n\r\n')
+    assert [status for status, _, _ in responses] == [200, 200]
+    assert responses[0][1]['connection'] == 'keep-alive' and responses[1][1]['connection'] == 'close'
+    assert json.loads(responses[0][2])['states'] == ds.states()
+
+
+def test_handle_reads_request_bodies(server):
+    body = json.dumps({'queries': [{'path': '/v1/states'}]}).encode()
+    request = b'POST /v1/batch HTTP/1.1\r\nContent-Length: %d\r\nConnection: close\r\n\r\n' % len(body) + body
+    [(status, _, answer)] = _serve(server, request)
+    assert status == 200 and json.loads(answer)['results'][0]['status'] == 200
+
+
+@pytest.mark.parametrize('request_line, headers, status', [
+    (b'GET /v1/states', b'', 400),
+    (b'POST /v1/batch HTTP/1.1', b'Content-Length: -3\r\n', 400),
+    (b'POST /v1/batch HTTP/1.1', b'Content-Length: three\r\n', 400),
+    (b'POST /v1/batch HTTP/1.1', b'Content-Length: %d\r\n' % (qs.MAX_BODY + 1), 413),
+    pytest.param(b'GET /v1/states?' + b'x' * 70_000 + b' HTTP/1.1', b'', 400, id='long-request-line'),
+    pytest.param(b'GET /v1/states HTTP/1.1', b'Cookie: ' + b'x' * 70_000 + b'\r\n', 400, id='long-header'),
+    pytest.param(b'GET /v1/states HTTP/1.1', b'X-Header: x\r\n' * (qs.MAX_HEADERS + 1), 400, id='many-headers'),
+])
+def test_handle_rejects_malformed_requests(server, request_line, headers, status):
+    [(answer_status, response_headers, _)] = _serve(server, request_line + b'\r\n' + headers + b'\r\n')
+    assert answer_status == status and response_headers['connection'] == 'close'
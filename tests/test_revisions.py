@@ -0,0 +1,201 @@
+import os
+import subprocess
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+import DataStore as ds
+import Ranking as rk
+import StateCube as sc
+
+METRICS = ['Population', 'literacy_rate', 'sex_ratio', 'Internet_households_per_1000']
+
+
+def _build_artifacts():
+    ds.partition()
+    sc.cube()
+    sc.national_describe()
+    ds.state_version('Kerala')
+    for metric in METRICS:
+        rk.top_districts('Kerala', metric, 'Top', 1)
+
+
+def _rows(state, positions):
+    return ds.state_slice(state).iloc[positions].astype({'State': str, 'District': str})
+
+
+def _revise():
+    # A changed row, a new district, a new state and a deleted row
+    kerala = _rows('Kerala', [0])
+    kerala['Population'] = 99_999_999
+    goa = _rows('Goa', [0])
+    goa['District code'], goa['District'] = 9001, 'New Goa'
+    testland = _rows('Goa', [0])
+    testland['State'], testland['District code'] = 'Testland', 1
+    bihar = ds.state_slice('Bihar').iloc[0]
+    return ds.apply_changes(pd.concat([kerala, goa, testland]),
+                            [(bihar['State'], int(bihar['District code'])), ('Nowhere', 5)])
+
+
+def _artifacts():
+    with ds._census()._lock:
+        return dict(ds._census()._derived)
+
+
+def _assert_same_ranking(updated, rebuilt):
+    assert list(updated['states']) == list(rebuilt['states'])
+    for state, orders in rebuilt['states'].items():
+        for order in ('Top', 'Bottom'):
+            np.testing.assert_array_equal(updated['states'][state][order], orders[order])
+    for order in ('Top', 'Bottom'):
+        np.testing.assert_array_equal(updated['national'][order], rebuilt['national'][order])
+
+
+def test_incremental_artifacts_match_a_rebuild(census_copy, monkeypatch):
+    _build_artifacts()
+    assert _revise() == ['Bihar', 'Goa', 'Kerala', 'Testland']
+    updated = _artifacts()
+    assert {'partition', 'state_cube', 'state_versions'} <= set(updated)
+
+    # Reopen the revised census without any derived artifacts and build them again
+    monkeypatch.setattr(ds, '_cache', {})
+    _build_artifacts()
+    rebuilt = _artifacts()
+
+    assert updated['partition'].states == rebuilt['partition'].states
+    assert list(updated['partition'].states) == list(rebuilt['partition'].states)
+    assert updated['partition'].districts == rebuilt['partition'].districts
+    for name in ('sums', 'describe', 'means', 'table'):
+        pd.testing.assert_frame_equal(getattr(updated['state_cube'], name), getattr(rebuilt['state_cube'], name))
+    for name in ('national_totals', 'national_means'):
+        pd.testing.assert_series_equal(getattr(updated['state_cube'], name), getattr(rebuilt['state_cube'], name))
+    # National statistics needing every row are rebuilt on next use rather than updated
+    assert 'national_describe' not in updated
+    assert updated['state_versions'] == rebuilt['state_versions']
+    for metric in METRICS:
+        key = f"ranking:district:{rk._key(metric)}"
+        _assert_same_ranking(updated[key], rebuilt[key])
+
+
+def test_successive_revisions_match_a_rebuild(census_copy, monkeypatch):
+    _build_artifacts()
+    columns = ds.CENSUS_SCHEMA.names + ['Internet_households_per_1000']
+    ds.census(columns)
+    # A tie with another district, missing ratios, a deleted row and rows of a new state
+    kerala = _rows('Kerala', [2])
+    kerala['Population'] = ds.state_slice('Goa', ['Population'])['Population'].iat[0]
+    ds.apply_changes(kerala)
+    goa = _rows('Goa', [0, 1])
+    goa['sex_ratio'] = goa['literacy_rate'] = np.nan
+    ds.apply_changes(goa)
+    bihar = ds.state_slice('Bihar').iloc[3]
+    ds.apply_changes(deletes=[(bihar['State'], int(bihar['District code']))])
+    testland = _rows('Kerala', [0, 1, 2])
+    testland['State'] = 'Testland'
+    ds.apply_changes(testland)
+    updated = _artifacts()
+    frame = ds.census(columns)
+
+    monkeypatch.setattr(ds, '_cache', {})
+    _build_artifacts()
+    pd.testing.assert_frame_equal(frame, ds.census(columns), check_categorical=False)
+    rebuilt = _artifacts()
+    for metric in METRICS:
+        key = f"ranking:district:{rk._key(metric)}"
+        _assert_same_ranking(updated[key], rebuilt[key])
+    pd.testing.assert_series_equal(updated['state_cube'].national_means, rebuilt['state_cube'].national_means)
+
+
+def test_state_versions_only_change_for_revised_states(census_copy):
+    before = {state: ds.state_version(state) for state in ds.states()}
+    revised = set(_revise())
+    after = {state: ds.state_version(state) for state in ds.states()}
+    assert {state for state in before if after.get(state) != before[state]} == revised - {'Testland'}
+    assert 'Testland' in after
+
+
+def test_revisions_are_replayed_until_compacted(census_copy, monkeypatch):
+    _revise()
+    version = ds.dataset_version()
+    monkeypatch.setattr(ds, '_cache', {})
+    dataset = ds._census()
+    assert dataset.head == dataset.base and dataset.log_size > 0
+    assert ds.dataset_version() == version
+
+    # The log is compacted once it reaches COMPACT_BYTES
+    monkeypatch.setattr(ds, 'COMPACT_BYTES', 1)
+    _set_population(1, 1)
+    assert ds._census().head == ds._census().version and ds._census().log_size == 0
+
+
+def test_restart_opens_the_compacted_snapshot(census_copy, monkeypatch):
+    _revise()
+    version = ds.dataset_version()
+    assert ds.compact() == ds._census().version
+    population = ds.state_slice('Kerala', ['Population'])['Population'].iat[0]
+
+    monkeypatch.setattr(ds, '_cache', {})
+    dataset = ds._census()
+    # Nothing is left to replay: the table is the revised snapshot itself
+    assert dataset.head == dataset.version and dataset.log_size == 0
+    assert ds.dataset_version() == version
+    assert ds.state_slice('Kerala', ['Population'])['Population'].iat[0] == population == 99_999_999
+    assert 'Bihar' in ds.states() and 'Testland' in ds.states()
+
+    # Revisions after a restart chain onto the compacted version
+    _set_population(1, 1)
+    monkeypatch.setattr(ds, '_cache', {})
+    assert ds.state_slice('Kerala', ['Population'])['Population'].iat[1] == 1
+
+
+def _set_population(position, population):
+    row = _rows('Kerala', [position])
+    row['Population'] = population
+    ds.apply_changes(row)
+
+
+def _kerala_populations(monkeypatch):
+    # Read back from a fresh load, i.e. from what is on disk rather than this process's cache
+    monkeypatch.setattr(ds, '_cache', {})
+    return ds.state_slice('Kerala', ['Population'])['Population'].tolist()
+
+
+def test_concurrent_revisions_are_all_kept(census_copy, monkeypatch):
+    ds.partition()
+    barrier = threading.Barrier(8)
+    errors = []
+
+    def revise(position):
+        try:
+            barrier.wait()
+            _set_population(position, 1_000_000 + position)
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=revise, args=(position,)) for position in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert _kerala_populations(monkeypatch)[:8] == [1_000_000 + position for position in range(8)]
+
+
+def test_revisions_from_several_processes_are_all_kept(census_copy, monkeypatch):
+    script = (
+        "import sys; sys.path.insert(0, {root!r})\n"
+        "import DataStore as ds\n"
+        "ds.CENSUS_PATH, ds.CACHE_DIR = {source!r}, {cache!r}\n"
+        "for position in {positions!r}:\n"
+        "    row = ds.state_slice('Kerala').iloc[[position]].astype({{'State': str, 'District': str}})\n"
+        "    row['Population'] = 2_000_000 + position\n"
+        "    ds.apply_changes(row)\n"
+    )
+    root = os.path.dirname(os.path.abspath(ds.__file__))
+    processes = [subprocess.Popen([sys.executable, '-c', script.format(
+        root=root, source=census_copy, cache=ds.CACHE_DIR, positions=list(range(first, 8, 2)))])
+        for first in (0, 1)]
+    assert [process.wait(timeout=300) for process in processes] == [0, 0]
+    assert _kerala_populations(monkeypatch)[:8] == [2_000_000 + position for position in range(8)]
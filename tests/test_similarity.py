@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+import DataStore as ds
+import Similarity as si
+import StateCube as sc
+
+
+def _brute_force_features(metrics):
+    # z-scores computed in float64 straight from the census columns
+    frame = ds.census(metrics)
+    columns = []
+    for metric in metrics:
+        values = frame[metric].to_numpy(dtype='float64', na_value=np.nan)
+        if metric in sc.COUNT_COLUMNS:
+            values = np.log1p(np.clip(values, 0, None))
+        spread = np.nanstd(values)
+        columns.append(np.nan_to_num((values - np.nanmean(values)) / (spread if spread > 0 else 1)))
+    return np.column_stack(columns)
+
+
+def _own_rows(state, district):
+    first = ds.partition().states[state][0]
+    start, stop = ds.partition().districts[state][district]
+    return first + start, first + stop
+
+
+@pytest.mark.parametrize('weights', [None, [3, 1, 1, 0, 2, 1.0]])
+def test_similar_matches_a_brute_force_search(scaled_census, weights):
+    matrix = _brute_force_features(si.DEFAULT_FEATURES)
+    np.testing.assert_allclose(si.features(si.DEFAULT_FEATURES), matrix, rtol=1e-5, atol=1e-5)
+
+    w = np.ones(matrix.shape[1]) if weights is None else np.asarray(weights)
+    for state in ds.states()[::6]:
+        district = ds.districts(state)[0]
+        start, stop = _own_rows(state, district)
+        distances = np.sqrt(((matrix - matrix[start]) ** 2) @ (w / w.sum()))
+        distances[start:stop] = np.inf
+
+        result = si.similar(state, district, 10, weights=weights, columns=['State', 'District'])
+        rows = ds.census(['District']).index.get_indexer(result.index)
+        assert not ((result['State'] == state) & (result['District'] == district)).any()
+        # Near ties may order differently in float32, so the distances are compared, not the rows
+        np.testing.assert_allclose(result['Distance'], np.sort(distances)[:10], rtol=1e-4, atol=1e-5)
+        np.testing.assert_allclose(distances[rows], np.sort(distances)[:10], rtol=1e-4, atol=1e-5)
+
+
+def test_similar_caps_k_at_the_other_districts(scaled_census):
+    state = ds.states()[0]
+    district = ds.districts(state)[0]
+    start, stop = _own_rows(state, district)
+    result = si.similar(state, district, 10 ** 9, columns=['District'])
+    assert len(result) == len(ds.census(['District'])) - (stop - start)
+    assert result['Distance'].is_monotonic_increasing
+
+
+@pytest.mark.parametrize('arguments', [
+    dict(weights=[0] * 6), dict(weights=[1, 2]), dict(weights=[-1, 1, 1, 1, 1, 1]),
+    dict(district='Nowhere'),
+])
+def test_similar_rejects_bad_arguments(census_copy, arguments):
+    state = ds.states()[0]
+    arguments = {'district': ds.districts(state)[0], **arguments}
+    with pytest.raises(ValueError):
+        si.similar(state, k=3, **arguments)
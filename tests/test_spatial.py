@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+import DataStore as ds
+import Spatial as sp
+
+
+def _coordinates():
+    frame = ds.census(['Latitude', 'Longitude'])
+    return frame['Latitude'].to_numpy('float64'), frame['Longitude'].to_numpy('float64')
+
+
+def _brute_force(latitude, longitude):
+    # Every row's distance, with rows without coordinates never in range
+    latitudes, longitudes = _coordinates()
+    distances = sp.haversine_km(latitude, longitude, latitudes, longitudes)
+    return np.where(np.isnan(distances), np.inf, distances)
+
+
+def _queries(count=100, seed=1):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([rng.uniform(6, 36, count), rng.uniform(68, 98, count)])
+
+
+def test_nearest_matches_a_brute_force_scan(scaled_census):
+    grid = sp.index()
+    for latitude, longitude in _queries():
+        distances = _brute_force(latitude, longitude)
+        for k in (1, 5, 20):
+            rows, kilometres = grid.nearest(latitude, longitude, k)
+            expected = np.lexsort((np.arange(len(distances)), distances))[:k]
+            np.testing.assert_array_equal(rows, expected)
+            np.testing.assert_allclose(kilometres, distances[expected])
+
+
+def test_within_matches_a_brute_force_scan(scaled_census):
+    grid = sp.index()
+    for latitude, longitude in _queries():
+        distances = _brute_force(latitude, longitude)
+        for radius in (30, 150):
+            rows, kilometres = grid.within(latitude, longitude, radius)
+            expected = np.flatnonzero(distances <= radius)
+            expected = expected[np.lexsort((expected, distances[expected]))]
+            np.testing.assert_array_equal(rows, expected)
+            np.testing.assert_allclose(kilometres, distances[expected])
+
+
+def test_batches_match_single_queries(scaled_census):
+    queries = _queries(20)
+    rows, distances = sp.nearest_batch(queries[:, 0], queries[:, 1], 5)
+    for (latitude, longitude), found, kilometres in zip(queries, rows, distances):
+        single = sp.nearest(latitude, longitude, 5, columns=['District'])
+        np.testing.assert_array_equal(ds.census(['District']).iloc[found].index, single.index)
+        np.testing.assert_allclose(kilometres, single['Distance_km'])
+    radii = np.linspace(20, 200, len(queries))
+    for (latitude, longitude), radius, (found, _) in zip(queries, radii, sp.within_batch(queries[:, 0],
+                                                                                       queries[:, 1], radii)):
+        np.testing.assert_array_equal(found, sp.index().within(latitude, longitude, radius)[0])
+
+
+def test_queries_far_from_every_district(scaled_census):
+    grid = sp.index()
+    rows, distances = grid.nearest(-30.0, 10.0, 3)
+    expected = np.lexsort((np.arange(len(_coordinates()[0])), _brute_force(-30.0, 10.0)))[:3]
+    np.testing.assert_array_equal(rows, expected)
+    assert grid.within(-30.0, 10.0, 100)[0].size == 0
+    assert grid.nearest(float('nan'), 77.0, 3)[0].size == 0
+
+
+@pytest.mark.parametrize('count, radius_km', [(5, None), (None, 120)])
+def test_neighbours_leave_out_the_district(scaled_census, count, radius_km):
+    state = 'Kerala'
+    district = ds.districts(state)[0]
+    own = ds.district_rows(state, district, ['Latitude', 'Longitude'])
+    nearby = sp.neighbours(state, district, count, radius_km, ['State', 'District'])
+
+    distances = _brute_force(own['Latitude'].iat[0], own['Longitude'].iat[0])
+    first = ds.partition().states[state][0]
+    start, stop = ds.partition().districts[state][district]
+    distances[first + start:first + stop] = np.inf
+    expected = np.lexsort((np.arange(len(distances)), distances))
+    expected = expected[:count] if radius_km is None else expected[distances[expected] <= radius_km]
+    assert len(nearby)
+    assert not ((nearby['State'] == state) & (nearby['District'] == district)).any()
+    np.testing.assert_array_equal(ds.census(['District']).index[expected], nearby.index)
+    np.testing.assert_allclose(nearby['Distance_km'], distances[expected])
@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+
+import DataStore as ds
+import StateCube as sc
+
+
+def test_state_describe_matches_pandas(scaled_census):
+    for state in ds.states():
+        expected = ds.state_slice(state, sc.DESCRIBED_COLUMNS).astype('float64').describe().T
+        pd.testing.assert_frame_equal(sc.state_describe(state), expected, check_names=False, rtol=1e-6)
+
+
+def test_national_describe_matches_pandas(scaled_census):
+    expected = ds.census(sc.DESCRIBED_COLUMNS).astype('float64').describe()
+    pd.testing.assert_frame_equal(sc.national_describe(), expected, rtol=1e-6)
+    pd.testing.assert_frame_equal(sc.national_describe(['Population', 'sex_ratio']),
+                                  expected[['Population', 'sex_ratio']], rtol=1e-6)
+
+
+def test_state_table_and_national_aggregates_match_pandas(scaled_census):
+    frame = ds.census(['State'] + ds.metric_columns())
+    sums = frame.groupby('State', observed=True)[sc.COUNT_COLUMNS].sum()
+    sums.index = sums.index.astype(str)
+    table = sc.state_table()
+    pd.testing.assert_frame_equal(table[sc.COUNT_COLUMNS], sums.loc[table.index], check_names=False)
+    for name, (numerator, denominator, scale) in sc.RATIOS.items():
+        expected = sums[numerator] / sums[denominator] * scale
+        np.testing.assert_allclose(table[name], expected.loc[table.index], rtol=1e-6)
+    pd.testing.assert_series_equal(sc.national_totals(), frame[sc.COUNT_COLUMNS].sum(), check_names=False)
+    pd.testing.assert_series_equal(sc.national_means(), frame[ds.metric_columns()].mean(), rtol=1e-6)